@@ -1,14 +1,19 @@
+import hashlib
+import time
+from types import MappingProxyType
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
-from database import get_db
+from database import get_db, async_session_maker
 from auth.service import AuthService
+from auth.principal import Principal
 from tables.users import User
 from tables.news import News
 from tables.comments import Comment
 from sqlalchemy import select
 from redis_cache.redis_client import get_redis
-import json
+from redis_cache.local_cache import users_local_cache, claims_local_cache, invalidate
+from redis_cache import swr
 from monitoring.monitoring import logger
 
 security = HTTPBearer()
@@ -16,9 +21,9 @@ security = HTTPBearer()
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: AsyncSession = Depends(get_db)
-    ) -> User:
+    ) -> Principal:
     token = credentials.credentials
-    payload = AuthService.verify_token(token)
+    payload = _verify_access_token(token)
 
     if not payload:
         logger.error(
@@ -42,15 +47,22 @@ async def get_current_user(
         )
     
     user_id = payload["user_id"]
-    redis_client = await get_redis()
+    # Сначала смотрим в кеш процесса - без похода в Redis и разбора JSON
+    principal = users_local_cache.get(str(user_id))
+    if principal:
+        return principal
+
+    token = users_local_cache.token()
     user_key = f"user_id:{user_id}"
-    cached_user = await redis_client.get(user_key)
-    if cached_user:
+    user_data, soft_expires_at = await swr.get_entry(user_key)
+    if user_data:
         print("Пользователь есть в кеше! Возвращаем...")
-        # Возвращаем словарь python
-        user_data = json.loads(cached_user)
-        # Создаем объект News, превращая словарь в именованные аргументы
-        return User(**user_data)
+        if swr.is_stale(soft_expires_at):
+            # Отдаём закешированного пользователя, а свежего читаем из БД в фоне
+            swr.refresh_in_background(user_key, lambda: _refresh_cached_user(user_id))
+        principal = Principal.from_dict(user_data)
+        users_local_cache.set(str(user_id), principal, token=token)
+        return principal
     print("Пользователя нет в кеше( сейчас засунем...")
     result = await db.execute(select(User).where(User.id == user_id))
     user = result.scalar_one_or_none()
@@ -58,37 +70,59 @@ async def get_current_user(
     if not user:
         logger.error(
             "failed_finding_user",
-            user_id=user.user_id
+            user_id=user_id
         )
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="User not found"
         )
     
-    user_dict = {
-        "id": user.id,
-        "name": user.name,
-        "email": user.email,
-        "registration_date": user.registration_date.isoformat(),
-        "is_verified_author": user.is_verified_author,
-        "is_admin": user.is_admin,
-        "avatar": user.avatar,
-        "password": user.password,
-        "github_id": user.github_id
-    }
-    # 300 секунд
-    expire_seconds = 300
-    await redis_client.set(user_key, json.dumps(user_dict), ex=expire_seconds)
+    principal = _user_to_principal(user)
+    await swr.set_entry(user_key, principal.to_dict())
+    users_local_cache.set(str(user_id), principal, token=token)
     
-    return user
+    return principal
+
+def _verify_access_token(token: str):
+    # jwt.decode на каждый запрос дорог - проверенные claims храним по хешу токена
+    # до истечения токена. Сам токен ключом не делаем, чтобы не держать его в памяти
+    token_digest = hashlib.sha256(token.encode()).digest()
+    payload = claims_local_cache.get(token_digest)
+    if payload:
+        return payload
+    payload = AuthService.verify_token(token)
+    if payload and "exp" in payload:
+        claims_local_cache.set(token_digest, MappingProxyType(payload), ttl=payload["exp"] - time.time())
+    return payload
+
+def _user_to_principal(user: User) -> Principal:
+    # В кеш кладём только поля для проверки прав - без хеша пароля
+    return Principal(
+        id=user.id,
+        email=user.email,
+        is_verified_author=user.is_verified_author,
+        is_admin=user.is_admin
+    )
+
+async def _refresh_cached_user(user_id: int):
+    async with async_session_maker() as db:
+        result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+    user_key = f"user_id:{user_id}"
+    if not user:
+        redis_client = await get_redis()
+        await redis_client.delete(user_key)
+    else:
+        await swr.set_entry(user_key, _user_to_principal(user).to_dict())
+    await invalidate(users_local_cache, user_id)
 
 async def get_current_verified_author(
-    current_user: User = Depends(get_current_user)
-    ) -> User:
+    current_user: Principal = Depends(get_current_user)
+    ) -> Principal:
     if not current_user.is_verified_author and not current_user.is_admin:
         logger.error(
             "failed_verifying_author_priviliges",
-            user_id=current_user.user_id
+            user_id=current_user.id
         )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -97,12 +131,12 @@ async def get_current_verified_author(
     return current_user
 
 def get_current_admin(
-    current_user: User = Depends(get_current_user)
-    ) -> User:
+    current_user: Principal = Depends(get_current_user)
+    ) -> Principal:
     if not current_user.is_admin:
         logger.error(
             "failed_verifying_admin_priviliges",
-            user_id=current_user.user_id
+            user_id=current_user.id
         )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -113,14 +147,14 @@ def get_current_admin(
 async def verify_news_access(
     news_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
     ):
     result = await db.execute(select(News).where(News.id == news_id))
     news = result.scalar_one_or_none()
     if not news:
         logger.error(
             "failed_getting_news",
-            user_id=current_user.user_id
+            user_id=current_user.id
         )
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -130,7 +164,7 @@ async def verify_news_access(
     if news.author_id != current_user.id and not current_user.is_admin:
         logger.error(
             "failed_provinng_admin_or_author_priviliges",
-            user_id=current_user.user_id
+            user_id=current_user.id
         )
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -140,7 +174,7 @@ async def verify_news_access(
 async def verify_comment_access(
     comment_id: int,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: Principal = Depends(get_current_user)
     ):
     result = await db.execute(select(Comment).where(Comment.id == comment_id))
     comment = result.scalar_one_or_none()
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from argon2 import PasswordHasher
+from argon2.exceptions import VerifyMismatchError, InvalidHashError
+from fastapi import HTTPException, status
+from config import settings
+from monitoring.monitoring import (
+    logger, PASSWORD_HASH_DURATION, PASSWORD_HASH_QUEUE_WAIT, PASSWORD_HASH_PENDING, PASSWORD_HASH_REJECTED
+)
+
+# Argon2 считает хеш десятки миллисекунд и держит процессор - в event loop это
+# останавливает все запросы воркера. Хеширование идёт в отдельном пуле потоков
+# (argon2-cffi отпускает GIL), а очередь к пулу ограничена: при переполнении
+# логин и регистрация получают 503, а не копятся в памяти
+
+ph = PasswordHasher(
+    time_cost=settings.ARGON2_TIME_COST,
+    memory_cost=settings.ARGON2_MEMORY_COST,
+    parallelism=settings.ARGON2_PARALLELISM
+)
+
+_executor = None
+_pending = 0
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Создаётся при первом использовании, уже в процессе воркера uvicorn
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="argon2")
+    return _executor
+
+def _timed(operation: str, submitted_at: float, func, *args):
+    started = time.perf_counter()
+    PASSWORD_HASH_QUEUE_WAIT.labels(operation=operation).observe(started - submitted_at)
+    try:
+        return func(*args)
+    finally:
+        PASSWORD_HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started)
+
+async def _run(operation: str, func, *args):
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_MAX_PENDING:
+        PASSWORD_HASH_REJECTED.labels(operation=operation).inc()
+        logger.error("password_hash_queue_full", operation=operation, pending=_pending)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"}
+        )
+    _pending += 1
+    PASSWORD_HASH_PENDING.inc()
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_get_executor(), _timed, operation, time.perf_counter(), func, *args)
+    finally:
+        _pending -= 1
+        PASSWORD_HASH_PENDING.dec()
+
+def _verify(hashed_password: str, plain_password: str) -> Tuple[bool, Optional[str]]:
+    try:
+        ph.verify(hashed_password, plain_password)
+    except (VerifyMismatchError, InvalidHashError):
+        return False, None
+    # Параметры поменялись - пароль известен только сейчас, заодно пересчитываем хеш
+    if ph.check_needs_rehash(hashed_password):
+        return True, ph.hash(plain_password)
+    return True, None
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", ph.hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Возвращает (пароль верный, новый хеш или None).
+    Новый хеш приходит, если хеш в БД посчитан со старыми параметрами Argon2.
+    """
+    if hashed_password is None:
+        return False, None
+    return await _run("verify", _verify, hashed_password, plain_password)
@@ -0,0 +1,30 @@
+from dataclasses import dataclass
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """
+    Текущий пользователь запроса: только то, что нужно для проверки прав.
+    Неизменяемый, поэтому один объект из локального кеша отдаётся всем запросам.
+    """
+    id: int
+    email: str
+    is_verified_author: bool
+    is_admin: bool
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Principal":
+        # В кеше могут лежать и полные записи пользователя - лишние поля отбрасываем
+        return cls(
+            id=data["id"],
+            email=data["email"],
+            is_verified_author=data["is_verified_author"],
+            is_admin=data["is_admin"]
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "email": self.email,
+            "is_verified_author": self.is_verified_author,
+            "is_admin": self.is_admin
+        }
@@ -1,10 +1,11 @@
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from auth.service import AuthService
 from auth.schemas import Token, UserLogin, SessionInfo
 from auth.dependencies import get_current_user
-from tables.users import User
+from auth.principal import Principal
+from services.users import UserService
 import schemas.users as user_schemas
 from auth.sso import github_sso
 from monitoring.monitoring import track_user_registration, logger
@@ -84,7 +85,7 @@ async def logout(
 
 @router.get("/sessions", response_model = list[SessionInfo])
 async def get_my_sessions(
-    current_user: User = Depends(get_current_user),
+    current_user: Principal = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
     ):
     logger.info(
@@ -95,13 +96,20 @@ async def get_my_sessions(
     return await AuthService.get_user_sessions(current_user.id)
 
 @router.get("/me", response_model=user_schemas.User)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+async def get_current_user_info(
+    current_user: Principal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+    ):
     'Показать данные текущего пользователя.'
     logger.info(
             "getting_user_info",
             user_id=current_user.id
     )
-    return current_user
+    # В Principal только поля для проверки прав, профиль целиком читаем из БД
+    user = await UserService.get_user(db=db, user_id=current_user.id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
 
 # Redirect на страничку github для авторизации
 @router.get("/github")
@@ -2,8 +2,7 @@ from datetime import datetime, timedelta
 from typing import Optional
 from fastapi import HTTPException, status, Request
 import jwt
-from argon2 import PasswordHasher
-from argon2.exceptions import VerifyMismatchError
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 from config import settings
 from tables.users import User
@@ -12,23 +11,19 @@ from auth.schemas import Token, UserLogin
 import schemas.users as user_schemas
 from auth.sso import github_sso
 from redis_cache.redis_client import get_redis
-import json
+from redis_cache.local_cache import users_local_cache, invalidate
+from auth.sessions import SessionStore
+from auth import passwords
 from datetime import datetime
 
-ph = PasswordHasher()
-
 class AuthService:
 
-    def verify_password(plain_password: str, hashed_password: str) -> bool:
-        if hashed_password is None:
-            return False
-        try:
-            return ph.verify(hashed_password, plain_password)
-        except VerifyMismatchError:
-            return False
+    async def verify_password(plain_password: str, hashed_password: str):
+        # Хеширование идёт в пуле потоков, см. auth/passwords.py
+        return await passwords.verify_password(plain_password, hashed_password)
 
-    def get_password_hash(password: str) -> str:
-        return ph.hash(password)
+    async def get_password_hash(password: str) -> str:
+        return await passwords.hash_password(password)
 
     def create_access_token(data: dict):
         to_encode = data.copy()
@@ -40,7 +35,9 @@ class AuthService:
     def create_refresh_token(data: dict):
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=int(settings.REFRESH_TOKEN_EXPIRE_DAYS))
-        to_encode.update({"exp": expire, "type": "refresh"})
+        # jti делает каждый refresh token уникальным, даже если он выпущен в ту же секунду,
+        # иначе ротация могла бы выдать токен, совпадающий со старым
+        to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
         return encoded_jwt
 
@@ -51,57 +48,27 @@ class AuthService:
         except jwt.PyJWTError:
             return None
 
-    async def create_refresh_session(user_id: int, refresh_token: str, user_agent: str = None):
+    def build_refresh_session(user_id: int, refresh_token: str, user_agent: str = None) -> dict:
         expires_at = datetime.utcnow() + timedelta(days=int(settings.REFRESH_TOKEN_EXPIRE_DAYS))
-
-        redis_client = await get_redis()
-        session_key = f"refresh_session:{refresh_token}"
-        session_dict = {
+        return {
             "user_id": user_id,
             "refresh_token": refresh_token,
             "user_agent": user_agent,
-            "created_at": datetime.utcnow().isoformat(),
-            "expires_at": expires_at.isoformat()
+            "created_at": datetime.utcnow(),
+            "expires_at": expires_at
         }
-        # 300 секунд
-        expire_seconds = 300
-        await redis_client.set(session_key, json.dumps(session_dict), ex=expire_seconds)
-        user_key = f"sessions_for_user_id:{user_id}"
-        # Создаём новую хеш-таблицу с единственным refresh_token
-        # или добавляем к существующей хещ-таблице значение refresh_token
-        await redis_client.sadd(user_key, refresh_token)
-        # Выставляем время жизни кеша
-        await redis_client.expire(user_key, expire_seconds)
 
-    async def get_refresh_session(refresh_token: str) -> Optional[dict]:
-        redis_client = await get_redis()
-        session_key = f'refresh_session:{refresh_token}'
-        cached_session = await redis_client.get(session_key)
-        if cached_session:
-            print("Сессия есть в кеше! Возвращаем...")
-            # Возвращаем словарь python
-            return json.loads(cached_session)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No session was found"
-            )
+    async def create_refresh_session(user_id: int, refresh_token: str, user_agent: str = None):
+        session_dict = AuthService.build_refresh_session(user_id, refresh_token, user_agent)
+        # Сессия добавляется в хеш всех сессий пользователя в Redis и в очередь записи в БД
+        await SessionStore.create(user_id, refresh_token, session_dict)
 
     async def delete_refresh_session(request: Request):
         refresh_token = request.headers.get("Authorization", "").replace("Bearer ", "")
-        redis_client = await get_redis()
-        # Получаем сессию чтобы узнать user_id
-        session = await AuthService.get_refresh_session(refresh_token)
-        if session:
-            user_id = session.get("user_id")
-
-            session_key = f"refresh_session:{refresh_token}"
-            await redis_client.delete(session_key)
-
-            if user_id:
-                user_key = f'sessions_for_user_id:{user_id}'
-                await redis_client.srem(user_key, refresh_token)
-
+        # user_id берём из самого токена и отзываем сессию одним Lua-скриптом
+        payload = AuthService.verify_token(refresh_token)
+        if payload and payload.get("user_id") is not None \
+                and await SessionStore.revoke(payload["user_id"], refresh_token):
             return {"message": "Successfully logged out"}
         else:
             from main import get_hawk
@@ -113,17 +80,8 @@ class AuthService:
             )
 
     async def get_user_sessions(user_id: int):
-        redis_client = await get_redis()
-        user_key = f'sessions_for_user_id:{user_id}'
-        refresh_tokens = await redis_client.smembers(user_key)
-
-        sessions = []
-        for token in refresh_tokens:
-            session = await AuthService.get_refresh_session(token)
-            if session:
-                sessions.append(session)
-        
-        return sessions
+        # Все сессии одним запросом к Redis, истёкшие удаляются там же
+        return await SessionStore.user_sessions(user_id)
 
     async def create_or_update_user_from_github(db: AsyncSession, sso_user) -> User:
         github_id = sso_user.id
@@ -143,6 +101,11 @@ class AuthService:
                 user.email = email
             await db.commit()
             await db.refresh(user)
+
+            # Сбрасываем закешированного пользователя в Redis и во всех воркерах
+            redis_client = await get_redis()
+            await redis_client.delete(f"user_id:{user.id}")
+            await invalidate(users_local_cache, user.id)
         else:
             user = User(
                 github_id=github_id,
@@ -157,9 +120,13 @@ class AuthService:
         
         return user
     
-    async def create_user_tokens(db: AsyncSession, user: User, user_agent: str = None) -> Token:
+    def issue_tokens(user: User):
         access_token = AuthService.create_access_token(data={"user_id": user.id, "email": user.email})
         refresh_token = AuthService.create_refresh_token(data={"user_id": user.id})
+        return access_token, refresh_token
+
+    async def create_user_tokens(db: AsyncSession, user: User, user_agent: str = None) -> Token:
+        access_token, refresh_token = AuthService.issue_tokens(user)
         
         await AuthService.create_refresh_session(user.id, refresh_token, user_agent)
         
@@ -180,7 +147,7 @@ class AuthService:
                 status_code=status.HTTP_409_CONFLICT,
                 detail="Email already registered"
             )
-        password = AuthService.get_password_hash(user_data.password)
+        password = await AuthService.get_password_hash(user_data.password)
         user = User(
             name=user_data.name,
             email=user_data.email,
@@ -197,7 +164,8 @@ class AuthService:
         
         result = await db.execute(select(User).where(User.email == user_data.email))
         user = result.scalar_one_or_none()
-        if not user or not AuthService.verify_password(user_data.password, user.password):
+        verified, new_hash = await AuthService.verify_password(user_data.password, user.password if user else None)
+        if not verified:
             from main import get_hawk
             hawk = get_hawk()
             hawk.send(ValueError("Couldn't login user"), {"status_code": "401"})
@@ -206,10 +174,21 @@ class AuthService:
                 detail="Incorrect email or password"
                 
             )
+        if new_hash:
+            await AuthService.update_password_hash(db, user, new_hash)
         
         user_agent = request.headers.get("user-agent")
         
         return await AuthService.create_user_tokens(db, user, user_agent)
+
+    async def update_password_hash(db: AsyncSession, user: User, new_hash: str):
+        # Хеш со старыми параметрами Argon2 заменяем на новый, пока пароль известен
+        user.password = new_hash
+        await db.commit()
+        # В закешированном пользователе лежит и хеш пароля
+        redis_client = await get_redis()
+        await redis_client.delete(f"user_id:{user.id}")
+        await invalidate(users_local_cache, user.id)
     
     async def refresh_session(db: AsyncSession, request: Request):
         user_agent = request.headers.get("user-agent")
@@ -233,13 +212,6 @@ class AuthService:
                 detail="Invalid refresh token"
             )
 
-        session = await AuthService.get_refresh_session(refresh_token)
-        if not session:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Refresh session not found"
-            )
-    
         user_id = payload.get("user_id")
         result = await db.execute(select(User).where(User.id == user_id))
         user = result.scalar_one_or_none()
@@ -251,9 +223,23 @@ class AuthService:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="User not found"
             )
-        await AuthService.delete_refresh_session(request)
 
-        return await AuthService.create_user_tokens(db, user, user_agent)
+        # Старая сессия проверяется, удаляется и заменяется новой одним Lua-скриптом:
+        # из нескольких одновременных запросов с одним токеном выигрывает только один
+        access_token, new_refresh_token = AuthService.issue_tokens(user)
+        new_session = AuthService.build_refresh_session(user.id, new_refresh_token, user_agent)
+        rotated = await SessionStore.rotate(user.id, refresh_token, new_refresh_token, new_session)
+        if not rotated:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh session not found"
+            )
+
+        return Token(
+            access_token=access_token,
+            refresh_token=new_refresh_token,
+            token_type="bearer"
+        )
     
     async def get_github_callback(db: AsyncSession, request: Request):
         try:
@@ -0,0 +1,191 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from config import settings
+from database import async_session_maker
+from tables.session import RefreshSession
+from redis_cache import session_cache
+from redis_cache.single_flight import acquire_lock, release_lock, lock_key
+from monitoring.monitoring import logger
+
+# Хранилище refresh-сессий в два слоя: Redis держит активные сессии весь срок жизни токена,
+# таблица refresh_sessions - их долговременная копия. Изменения пишутся в Redis сразу,
+# а в БД - пачками в фоне (write-behind). Если Redis сессию потерял, она читается из БД
+# и возвращается в Redis. Изменения, которые не успели уйти в БД, теряются вместе с Redis
+
+# Очередь записи в БД разбирает один воркер за раз
+WRITE_BEHIND_LOCK = "sessions:write_behind"
+WRITE_BEHIND_LOCK_TTL_MS = 30000
+
+def _to_db_time(value: str) -> datetime:
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc)
+
+def _from_db_time(value: Optional[datetime]) -> Optional[datetime]:
+    # В Redis даты лежат в UTC без зоны, как их выдаёт datetime.utcnow()
+    if value is None:
+        return None
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _row_to_session(row: RefreshSession) -> dict:
+    return {
+        "user_id": row.user_id,
+        "refresh_token": row.refresh_token,
+        "user_agent": row.user_agent,
+        "created_at": _from_db_time(row.created_at),
+        "expires_at": _from_db_time(row.expires_at)
+    }
+
+class SessionStore:
+
+    _writer_task = None
+
+    def ttl() -> int:
+        # Сессия в Redis живёт столько же, сколько refresh token
+        return int(settings.REFRESH_TOKEN_EXPIRE_DAYS) * 86400
+
+    async def create(user_id: int, refresh_token: str, session: dict):
+        await session_cache.add_session(user_id, refresh_token, session, SessionStore.ttl())
+
+    async def rotate(user_id: int, old_token: str, new_token: str, new_session: dict) -> bool:
+        """Атомарно заменяет сессию old_token новой. False - старой сессии нет или она отозвана."""
+        result = await session_cache.rotate_session(user_id, old_token, new_token, new_session, SessionStore.ttl())
+        if result == session_cache.MISSING and await SessionStore._rehydrate(user_id, old_token):
+            result = await session_cache.rotate_session(
+                user_id, old_token, new_token, new_session, SessionStore.ttl()
+            )
+        return result == session_cache.OK
+
+    async def revoke(user_id: int, refresh_token: str) -> bool:
+        result = await session_cache.revoke_session(user_id, refresh_token)
+        if result == session_cache.MISSING and await SessionStore._rehydrate(user_id, refresh_token):
+            result = await session_cache.revoke_session(user_id, refresh_token)
+        return result == session_cache.OK
+
+    async def user_sessions(user_id: int) -> list:
+        sessions = await session_cache.list_sessions(user_id)
+        if sessions is None and await SessionStore._rehydrate(user_id):
+            sessions = await session_cache.list_sessions(user_id)
+        return sessions or []
+
+    async def _rehydrate(user_id: int, refresh_token: str = None) -> bool:
+        """
+        Читает живые сессии пользователя (или одну сессию) из БД и возвращает их в Redis.
+        False - в БД ничего нет.
+        """
+        query = select(RefreshSession).where(
+            RefreshSession.user_id == user_id,
+            RefreshSession.expires_at > func.now()
+        )
+        if refresh_token is not None:
+            query = query.where(RefreshSession.refresh_token == refresh_token)
+        async with async_session_maker() as db:
+            result = await db.execute(query)
+            sessions = [_row_to_session(row) for row in result.scalars()]
+        if not sessions:
+            return False
+        print("Сессии нет в Redis, но есть в БД - возвращаем в кеш...")
+        await session_cache.rehydrate_sessions(user_id, sessions, SessionStore.ttl())
+        return True
+
+    async def flush_write_behind() -> int:
+        """Переносит пачку изменений из Redis в refresh_sessions. Возвращает число изменений."""
+        token = await acquire_lock(WRITE_BEHIND_LOCK, WRITE_BEHIND_LOCK_TTL_MS)
+        if token is None:
+            return 0
+        try:
+            events = await session_cache.pending_writes(settings.SESSION_WRITE_BEHIND_BATCH)
+            if not events:
+                return 0
+            # Изменения применяются по порядку, в БД уходит только итог по каждому токену
+            latest = {}
+            revoked = {}
+            for event in events:
+                for session in event["add"]:
+                    latest[session["refresh_token"]] = session
+                for user_id, refresh_token in event["delete"]:
+                    latest[refresh_token] = None
+                    revoked[refresh_token] = user_id
+            added = [session for session in latest.values() if session is not None]
+            deleted = [refresh_token for refresh_token, session in latest.items() if session is None]
+            async with async_session_maker() as db:
+                if added:
+                    # Пачка может прийти повторно, если воркер упал до ack - вставка идемпотентна
+                    await db.execute(
+                        insert(RefreshSession)
+                        .values([
+                            {
+                                "user_id": session["user_id"],
+                                "refresh_token": session["refresh_token"],
+                                "user_agent": session["user_agent"],
+                                "created_at": _to_db_time(session["created_at"]),
+                                "expires_at": _to_db_time(session["expires_at"])
+                            }
+                            for session in added
+                        ])
+                        .on_conflict_do_nothing(index_elements=[RefreshSession.refresh_token])
+                    )
+                if deleted:
+                    await db.execute(delete(RefreshSession).where(RefreshSession.refresh_token.in_(deleted)))
+                await db.commit()
+            # Пачка и отметки об отзыве удаляются, только если блокировка всё ещё наша
+            acked = await session_cache.ack_writes(
+                lock_key(WRITE_BEHIND_LOCK), token, len(events),
+                [(user_id, refresh_token) for refresh_token, user_id in revoked.items()]
+            )
+            if not acked:
+                logger.error(
+                    "session_write_behind_lock_lost",
+                    events=len(events)
+                )
+                return 0
+            return len(events)
+        finally:
+            await release_lock(WRITE_BEHIND_LOCK, token)
+
+    async def delete_expired() -> int:
+        async with async_session_maker() as db:
+            result = await db.execute(delete(RefreshSession).where(RefreshSession.expires_at <= func.now()))
+            await db.commit()
+        return result.rowcount
+
+    async def _write_behind_forever():
+        last_cleanup = time.monotonic()
+        while True:
+            try:
+                # Пока очередь не пуста, пачки идут подряд
+                while await SessionStore.flush_write_behind() >= settings.SESSION_WRITE_BEHIND_BATCH:
+                    pass
+                if time.monotonic() - last_cleanup >= settings.SESSION_CLEANUP_INTERVAL:
+                    await SessionStore.delete_expired()
+                    last_cleanup = time.monotonic()
+            except Exception as e:
+                logger.error(
+                    "failed_writing_sessions_to_db",
+                    error=str(e)
+                )
+            await asyncio.sleep(settings.SESSION_WRITE_BEHIND_INTERVAL)
+
+    def start_write_behind():
+        if SessionStore._writer_task is None:
+            SessionStore._writer_task = asyncio.create_task(SessionStore._write_behind_forever())
+
+    async def stop_write_behind():
+        task = SessionStore._writer_task
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            SessionStore._writer_task = None
+            # Последняя пачка перед остановкой, чтобы изменения не ждали другого воркера
+            try:
+                await SessionStore.flush_write_behind()
+            except Exception as e:
+                logger.error(
+                    "failed_writing_sessions_to_db",
+                    error=str(e)
+                )
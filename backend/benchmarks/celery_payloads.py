@@ -0,0 +1,71 @@
+"""
+Размер и время сериализации сообщения send_email_task для одной порции рассылки:
+раньше в задачу передавались словари пользователей и новость целиком (с content),
+теперь только id, а большие списки id дополнительно сжимаются.
+
+    python benchmarks/celery_payloads.py [размер порции] [кол-во повторов]
+"""
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from kombu import compression
+from kombu.serialization import dumps
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from celery_.app import PAYLOAD_COMPRESSION
+
+def build_payloads(chunk_size: int) -> dict:
+    now = datetime.now(timezone.utc).isoformat()
+    news_data = {
+        "id": 1,
+        "title": "Заголовок новости",
+        "content": "Текст новости. " * 200,
+        "publication_date": now,
+        "author_id": 1,
+        "cover_image": None
+    }
+    users_data = [
+        {
+            "id": i,
+            "name": f"Пользователь {i}",
+            "email": f"user{i}@example.com",
+            "registration_date": now,
+            "is_verified_author": False,
+            "is_admin": False,
+            "avatar": None,
+            "github_id": None
+        }
+        for i in range(chunk_size)
+    ]
+    return {
+        "dicts": ((users_data, news_data), {}),
+        "ids": ((1, list(range(chunk_size))), {}),
+    }
+
+def encode(payload, compress: bool) -> bytes:
+    _, _, body = dumps(payload, serializer="json")
+    if compress:
+        body, _ = compression.compress(body, PAYLOAD_COMPRESSION)
+    return body
+
+def measure(payload, compress: bool, repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        encode(payload, compress)
+    return (time.perf_counter() - start) / repeats
+
+def main(chunk_size: int, repeats: int):
+    for name, payload in build_payloads(chunk_size).items():
+        for compress in (False, True):
+            label = f"{name}+{PAYLOAD_COMPRESSION}" if compress else name
+            size = len(encode(payload, compress))
+            elapsed = measure(payload, compress, repeats)
+            print(f"{label:10} {size:8} байт  {elapsed * 1e6:9.2f} мкс")
+
+if __name__ == "__main__":
+    chunk_size = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    main(chunk_size, repeats)
@@ -0,0 +1,77 @@
+"""
+Сравнение кодеков JSON из serialization.py на данных, которые реально лежат в кеше:
+страница новостей, словарь пользователя и refresh-сессия (с datetime внутри).
+
+Неустановленные кодеки пропускаются.
+
+    python benchmarks/json_codecs.py [кол-во повторов]
+"""
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from serialization import CODECS
+
+def build_samples() -> dict:
+    now = datetime.now(timezone.utc)
+    news_page = [
+        {
+            "id": i,
+            "title": f"Заголовок новости {i}",
+            "content": "Текст новости. " * 40,
+            "publication_date": now,
+            "author_id": 1,
+            "cover_image": None
+        }
+        for i in range(100)
+    ]
+    user = {
+        "id": 1,
+        "name": "Иван",
+        "email": "ivan@example.com",
+        "registration_date": now,
+        "is_verified_author": True,
+        "is_admin": False,
+        "avatar": None,
+        "password": "$2b$12$" + "x" * 53,
+        "github_id": None
+    }
+    session = {
+        "user_id": 1,
+        "refresh_token": "x" * 180,
+        "created_at": now,
+        "expires_at": now + timedelta(days=7)
+    }
+    return {"news_page": news_page, "user": user, "session": session}
+
+def measure(func, arg, repeats: int) -> float:
+    for _ in range(min(repeats, 100)):
+        func(arg)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func(arg)
+    return (time.perf_counter() - start) / repeats
+
+def main(repeats: int):
+    samples = build_samples()
+    for name, codec_class in CODECS.items():
+        try:
+            codec = codec_class()
+        except ImportError:
+            print(f"{name}: не установлен, пропускаем")
+            continue
+        for sample_name, sample in samples.items():
+            encoded = codec.dumps(sample)
+            dumps_time = measure(codec.dumps, sample, repeats)
+            loads_time = measure(codec.loads, encoded, repeats)
+            print(
+                f"{name:8} {sample_name:10} "
+                f"dumps: {dumps_time * 1e6:8.2f} мкс  loads: {loads_time * 1e6:8.2f} мкс"
+            )
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    main(repeats)
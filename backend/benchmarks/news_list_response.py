@@ -0,0 +1,78 @@
+"""
+Сравнение стоимости попадания в кеш для GET /news/.
+
+before - как было: из кеша читается JSON-список, json.loads, из словарей собираются
+объекты News, FastAPI валидирует их через response_model и заново кодирует в JSON.
+after - как стало: в кеше лежит готовое тело ответа, роутер отдаёт его как Response.
+
+Redis и БД не нужны: кеш имитируется строкой в памяти, запросы идут через ASGI.
+
+    python benchmarks/news_list_response.py [кол-во новостей] [кол-во запросов]
+"""
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import FastAPI, Response
+from httpx import AsyncClient, ASGITransport
+from tables.news import News
+import schemas.news as news_schemas
+
+def build_app(news_count: int) -> FastAPI:
+    news_list = [
+        {
+            "id": i,
+            "title": f"Заголовок новости {i}",
+            "content": "Текст новости. " * 40,
+            "publication_date": datetime.now(timezone.utc).isoformat(),
+            "author_id": 1,
+            "cover_image": None
+        }
+        for i in range(news_count)
+    ]
+    cached_list = json.dumps(news_list)
+    cached_body = "[" + ",".join(
+        news_schemas.News.model_validate(item).model_dump_json() for item in news_list
+    ) + "]"
+
+    app = FastAPI()
+
+    @app.get("/before", response_model=list[news_schemas.News])
+    async def before():
+        return [News(**item) for item in json.loads(cached_list)]
+
+    @app.get("/after", response_model=list[news_schemas.News])
+    async def after():
+        return Response(content=cached_body, media_type="application/json")
+
+    return app
+
+async def measure(client: AsyncClient, path: str, requests: int) -> float:
+    # Прогрев
+    for _ in range(10):
+        await client.get(path)
+    start = time.perf_counter()
+    for _ in range(requests):
+        response = await client.get(path)
+        assert response.status_code == 200
+    return (time.perf_counter() - start) / requests
+
+async def main(news_count: int, requests: int):
+    app = build_app(news_count)
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        before = await measure(client, "/before", requests)
+        after = await measure(client, "/after", requests)
+    print(f"Новостей на странице: {news_count}, запросов: {requests}")
+    print(f"before: {before * 1000:.3f} мс на запрос")
+    print(f"after:  {after * 1000:.3f} мс на запрос")
+    print(f"ускорение: x{before / after:.1f}")
+
+if __name__ == "__main__":
+    news_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    asyncio.run(main(news_count, requests))
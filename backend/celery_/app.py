@@ -1,5 +1,33 @@
 from celery import Celery
 from celery.schedules import crontab
+from kombu import Exchange, Queue
+
+# Отдельные очереди, чтобы массовые задачи не задерживали срочные:
+# transactional - письма о новостях, bulk - раздача рассылок и догрузка архива,
+# reports - дайджесты. Воркеры для каждой очереди масштабируются независимо
+QUEUE_TRANSACTIONAL = "transactional"
+QUEUE_BULK = "bulk"
+QUEUE_REPORTS = "reports"
+QUEUES = (QUEUE_TRANSACTIONAL, QUEUE_BULK, QUEUE_REPORTS)
+
+# Приоритеты внутри очереди (в Redis 0 - самый высокий)
+PRIORITY_STEPS = [0, 3, 6, 9]
+PRIORITY_SEP = ":"
+
+TASK_ROUTES = {
+    "celery_.tasks.send_email_task": {"queue": QUEUE_TRANSACTIONAL, "priority": 0},
+    "celery_.tasks.send_news_emails_task": {"queue": QUEUE_BULK, "priority": 3},
+    "celery_.tasks.backfill_digests_task": {"queue": QUEUE_BULK, "priority": 9},
+    "celery_.tasks.sunday_reminder_task": {"queue": QUEUE_REPORTS, "priority": 3},
+    "celery_.tasks.archive_digest_task": {"queue": QUEUE_REPORTS, "priority": 9},
+}
+
+def queue_keys(queue: str) -> list:
+    """Ключи Redis, в которых брокер хранит сообщения очереди, по одному на приоритет."""
+    return [queue if step == 0 else f"{queue}{PRIORITY_SEP}{step}" for step in PRIORITY_STEPS]
+
+# Большие аргументы (списки получателей) сжимаются, мелкие задачи идут как есть
+PAYLOAD_COMPRESSION = "zlib"
 
 def create_celery_app():
     app = Celery(
@@ -12,12 +40,24 @@ def create_celery_app():
         task_serializer="json",
         result_serializer="json",
         accept_content=["json"],
+        # Результаты никто не читает - по умолчанию не пишем их в Redis,
+        # задачи, которым результат нужен, включают его сами (ignore_result=False)
+        task_ignore_result=True,
+        result_expires=86400,
         timezone="Europe/Moscow",
         enable_utc=True,
         worker_prefetch_multiplier=1,
         task_acks_late=True,
         task_acks_on_failure_or_timeout=True,
-        broker_transport_options={"visibility_timeout": 3600},
+        broker_transport_options={
+            "visibility_timeout": 3600,
+            "queue_order_strategy": "priority",
+            "priority_steps": PRIORITY_STEPS,
+            "sep": PRIORITY_SEP,
+        },
+        task_queues=[Queue(queue, Exchange(queue), routing_key=queue) for queue in QUEUES],
+        task_default_queue=QUEUE_TRANSACTIONAL,
+        task_routes=TASK_ROUTES,
     )
 
     app.conf.beat_schedule = {
@@ -0,0 +1,113 @@
+import hashlib
+import uuid
+from config import settings
+from celery_ import runtime
+from redis_cache.redis_client import get_redis, get_script
+from monitoring.monitoring import TASK_DUPLICATES_SUPPRESSED
+
+# При acks_late задача может выполниться повторно: воркер упал до подтверждения,
+# истёк visibility_timeout или outbox отправил событие ещё раз.
+# Поэтому задача и каждый получатель сначала захватываются в Redis (SET NX с арендой),
+# и только захвативший запуск выполняет работу - даже если второй запуск пришёл,
+# пока первый ещё отправляет письма. После успеха захват становится отметкой о выполнении.
+# Аренда короче visibility_timeout: если воркер упал, повторная доставка уже не упрётся в захват.
+
+DONE = "done"
+
+# Снимает захваты, которые всё ещё принадлежат этому запуску
+RELEASE_CLAIMS_SCRIPT = """
+for _, key in ipairs(KEYS) do
+    if redis.call('GET', key) == ARGV[1] then
+        redis.call('DEL', key)
+    end
+end
+return 0
+"""
+
+def done_key(idempotency_key: str) -> str:
+    return f"task:done:{idempotency_key}"
+
+def sent_key(news_id: int, user_id: int) -> str:
+    return f"email:sent:{news_id}:{user_id}"
+
+def email_batch_key(news_id: int, user_ids: list) -> str:
+    """Ключ порции рассылки по умолчанию: новость и набор получателей."""
+    digest = hashlib.sha1(",".join(map(str, sorted(user_ids))).encode()).hexdigest()
+    return f"send_email:{news_id}:{digest}"
+
+def claim(task: str, idempotency_key: str) -> str:
+    """
+    Захватывает выполнение задачи: SET NX с арендой IDEMPOTENCY_LEASE.
+    Возвращает токен захвата или None, если задачу уже выполняет или выполнил другой запуск -
+    тогда повтор учитывается в метрике.
+    """
+    token = uuid.uuid4().hex
+
+    async def acquire():
+        redis_client = await get_redis()
+        return await redis_client.set(
+            done_key(idempotency_key), token, nx=True, px=settings.IDEMPOTENCY_LEASE * 1000
+        )
+
+    if runtime.run(acquire()):
+        return token
+    TASK_DUPLICATES_SUPPRESSED.labels(task=task).inc()
+    return None
+
+def mark_done(idempotency_key: str):
+    """Превращает захват в отметку о выполнении на IDEMPOTENCY_TTL."""
+    async def mark():
+        redis_client = await get_redis()
+        await redis_client.set(done_key(idempotency_key), DONE, ex=settings.IDEMPOTENCY_TTL)
+
+    runtime.run(mark())
+
+def _release(keys: list, token: str):
+    async def release():
+        await get_script(RELEASE_CLAIMS_SCRIPT)(keys=keys, args=[token])
+
+    runtime.run(release())
+
+def release(idempotency_key: str, token: str):
+    """Снимает захват задачи, чтобы повтор после ошибки мог выполнить её заново."""
+    _release([done_key(idempotency_key)], token)
+
+def claim_recipients(news_id: int, users: list, token: str) -> list:
+    """
+    Захватывает получателей перед отправкой (SET NX с арендой, одним pipeline).
+    Возвращает тех, кого удалось захватить: остальным письмо уже ушло
+    или его прямо сейчас отправляет другой запуск.
+    """
+    if not users:
+        return users
+
+    async def acquire():
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        for user in users:
+            pipe.set(sent_key(news_id, user["id"]), token, nx=True, px=settings.IDEMPOTENCY_LEASE * 1000)
+        return await pipe.execute()
+
+    claimed = [user for user, acquired in zip(users, runtime.run(acquire())) if acquired]
+    if len(claimed) < len(users):
+        TASK_DUPLICATES_SUPPRESSED.labels(task="send_email_recipient").inc(len(users) - len(claimed))
+    return claimed
+
+def mark_sent(news_id: int, users: list):
+    """Захват получателя превращается в отметку об отправленном письме."""
+    if not users:
+        return
+
+    async def mark():
+        redis_client = await get_redis()
+        pipe = redis_client.pipeline(transaction=False)
+        for user in users:
+            pipe.set(sent_key(news_id, user["id"]), DONE, ex=settings.IDEMPOTENCY_TTL)
+        await pipe.execute()
+
+    runtime.run(mark())
+
+def release_recipients(news_id: int, users: list, token: str):
+    """Снимает захват с получателей, которым письмо не ушло. Отметки об отправке не трогает."""
+    if users:
+        _release([sent_key(news_id, user["id"]) for user in users], token)
@@ -0,0 +1,157 @@
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from email.message import EmailMessage
+from config import settings
+from celery_.logger import get_logger
+from monitoring.monitoring import (
+    EMAIL_SENT, EMAIL_FAILED, EMAIL_BATCH_DURATION, EMAIL_BATCH_THROUGHPUT, EMAIL_BATCH_FAILED_RECIPIENTS
+)
+
+logger = get_logger()
+
+# Отказ сервера по конкретному письму: соединение при этом рабочее, его можно вернуть в пул
+RECIPIENT_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
+
+class LogOnlySMTP:
+    """Заглушка SMTP для окружений без почтового сервера - письма только пишутся в лог."""
+
+    def send_message(self, message: EmailMessage):
+        logger.info(f"Отправляю рассылку на {message['To']}")
+
+    def quit(self):
+        pass
+
+def connect():
+    if not settings.SMTP_HOST:
+        return LogOnlySMTP()
+    smtp = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=settings.SMTP_TIMEOUT)
+    if settings.SMTP_STARTTLS:
+        smtp.starttls()
+    if settings.SMTP_USER:
+        smtp.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+    return smtp
+
+def _close(smtp):
+    try:
+        smtp.quit()
+    except Exception:
+        pass
+
+class SMTPPool:
+    """
+    Пул открытых SMTP-соединений одного процесса. Соединение живёт между пачками
+    и задачами, поэтому на каждое письмо не тратятся подключение, TLS и логин.
+    """
+
+    def __init__(self, size: int, connect=connect):
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            try:
+                smtp = self._idle.get_nowait()
+            except queue.Empty:
+                smtp = self._connect()
+            try:
+                yield smtp
+            except RECIPIENT_ERRORS:
+                self._idle.put(smtp)
+                raise
+            except BaseException:
+                # Соединение в неизвестном состоянии - закрываем, следующее откроется заново
+                _close(smtp)
+                raise
+            else:
+                self._idle.put(smtp)
+
+    def close(self):
+        while True:
+            try:
+                _close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+_pool = None
+_executor = None
+
+def _get_pool():
+    # Пул и потоки создаются лениво, уже в процессе воркера после fork
+    global _pool, _executor
+    if _pool is None:
+        _pool = SMTPPool(settings.SMTP_POOL_SIZE)
+        _executor = ThreadPoolExecutor(max_workers=settings.SMTP_POOL_SIZE, thread_name_prefix="smtp")
+    return _pool, _executor
+
+def build_message(news_data: dict, user: dict) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = settings.EMAIL_FROM
+    message["To"] = user["email"]
+    message["Subject"] = news_data["title"]
+    message.set_content(f"Здравствуйте, {user['name']}!\n\n{news_data['content']}")
+    return message
+
+def _send_one(pool: SMTPPool, news_data: dict, user: dict):
+    """Возвращает None, если письмо ушло, иначе причину ошибки."""
+    message = build_message(news_data, user)
+    # Сервер мог закрыть простаивавшее соединение - один раз пробуем на новом
+    for attempt in range(2):
+        try:
+            with pool.connection() as smtp:
+                smtp.send_message(message)
+            return None
+        except RECIPIENT_ERRORS:
+            return "refused"
+        except smtplib.SMTPServerDisconnected:
+            if attempt == 0:
+                continue
+            return "connection"
+        except (smtplib.SMTPException, OSError):
+            return "connection"
+
+def send_batch(news_data: dict, users: list) -> list:
+    """Параллельно отправляет письма одной пачке получателей, возвращает тех, кому не ушло."""
+    pool, executor = _get_pool()
+    start = time.perf_counter()
+    reasons = list(executor.map(lambda user: _send_one(pool, news_data, user), users))
+    duration = time.perf_counter() - start
+
+    failed = [user for user, reason in zip(users, reasons) if reason]
+    for reason in reasons:
+        if reason:
+            EMAIL_FAILED.labels(reason=reason).inc()
+    EMAIL_SENT.inc(len(users) - len(failed))
+    EMAIL_BATCH_DURATION.observe(duration)
+    EMAIL_BATCH_THROUGHPUT.observe((len(users) - len(failed)) / duration if duration else 0)
+    EMAIL_BATCH_FAILED_RECIPIENTS.observe(len(failed))
+    logger.info(
+        f"Пачка из {len(users)} писем: отправлено {len(users) - len(failed)}, "
+        f"ошибок {len(failed)}, {duration:.2f} с"
+    )
+    return failed
+
+def deliver(news_data: dict, users: list, batch_size: int = None, on_sent=None) -> list:
+    """
+    Рассылает письма пачками по batch_size, возвращает получателей, которым письмо не ушло.
+    on_sent вызывается после каждой пачки со списком тех, кому письмо ушло.
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    failed = []
+    for i in range(0, len(users), batch_size):
+        batch = users[i:i + batch_size]
+        batch_failed = send_batch(news_data, batch)
+        failed.extend(batch_failed)
+        if on_sent:
+            failed_ids = {user["id"] for user in batch_failed}
+            on_sent([user for user in batch if user["id"] not in failed_ids])
+    return failed
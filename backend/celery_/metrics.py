@@ -0,0 +1,31 @@
+import time
+from celery.signals import before_task_publish, task_prerun, task_postrun
+from monitoring.monitoring import CELERY_TASK_QUEUE_WAIT, CELERY_TASK_RUNTIME
+
+# Задержка в очереди и время выполнения задач с разбивкой по очередям.
+# Время публикации передаётся в заголовке сообщения, воркер сравнивает его со временем старта
+
+_started = {}
+
+def _queue(task) -> str:
+    delivery_info = task.request.delivery_info or {}
+    return delivery_info.get("routing_key") or "unknown"
+
+@before_task_publish.connect
+def stamp_published_at(headers=None, **kwargs):
+    if headers is not None:
+        headers.setdefault("published_at", time.time())
+
+@task_prerun.connect
+def observe_queue_wait(task_id=None, task=None, **kwargs):
+    now = time.time()
+    _started[task_id] = now
+    published_at = getattr(task.request, "published_at", None)
+    if published_at:
+        CELERY_TASK_QUEUE_WAIT.labels(queue=_queue(task), task=task.name).observe(max(now - published_at, 0))
+
+@task_postrun.connect
+def observe_runtime(task_id=None, task=None, **kwargs):
+    started = _started.pop(task_id, None)
+    if started is not None:
+        CELERY_TASK_RUNTIME.labels(queue=_queue(task), task=task.name).observe(time.time() - started)
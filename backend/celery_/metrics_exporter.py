@@ -0,0 +1,45 @@
+"""
+Отдаёт метрики Celery для Prometheus (job celery_metrics):
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/celery_metrics python -m celery_.metrics_exporter
+
+- celery_queue_depth{queue} - сколько сообщений ждёт в каждой очереди, читается из брокера при опросе;
+- метрики, которые пишут процессы воркеров (задержка в очереди, время выполнения, рассылка),
+  если воркеры и экспортер запущены с одним PROMETHEUS_MULTIPROC_DIR.
+"""
+import os
+import time
+import redis
+from prometheus_client import CollectorRegistry, start_http_server, multiprocess
+from prometheus_client.core import GaugeMetricFamily
+from config import settings
+from celery_.app import QUEUES, queue_keys
+from celery_.tasks import app
+
+class QueueDepthCollector:
+
+    def __init__(self, broker_url: str):
+        self._redis = redis.Redis.from_url(broker_url)
+
+    def collect(self):
+        depth = GaugeMetricFamily('celery_queue_depth', 'Messages waiting in a Celery queue', labels=['queue'])
+        pipe = self._redis.pipeline(transaction=False)
+        for queue in QUEUES:
+            for key in queue_keys(queue):
+                pipe.llen(key)
+        lengths = iter(pipe.execute())
+        for queue in QUEUES:
+            depth.add_metric([queue], sum(next(lengths) for _ in queue_keys(queue)))
+        yield depth
+
+def main():
+    registry = CollectorRegistry()
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.MultiProcessCollector(registry)
+    registry.register(QueueDepthCollector(app.conf.broker_url))
+    start_http_server(settings.CELERY_METRICS_PORT, registry=registry)
+    while True:
+        time.sleep(3600)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Relay outbox: забирает записанные в БД задачи и отправляет их в Celery.
+
+    python -m celery_.outbox_relay
+
+Несколько relay могут работать одновременно: строки берутся с FOR UPDATE SKIP LOCKED,
+поэтому каждую пачку обрабатывает один процесс. Строка удаляется в той же транзакции
+уже после отправки, так что при падении между ними задача уйдёт повторно -
+доставка как минимум один раз.
+"""
+import asyncio
+from sqlalchemy import select, delete
+from config import settings
+from database import async_session_maker, engine
+from tables.outbox import OutboxEvent
+from celery_.tasks import app
+from celery_.logger import get_logger
+
+logger = get_logger()
+
+async def relay_batch(batch_size: int = None) -> int:
+    """Отправляет одну пачку событий, возвращает их число."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    async with async_session_maker() as db:
+        result = await db.execute(
+            select(OutboxEvent)
+            .order_by(OutboxEvent.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        events = result.scalars().all()
+        if not events:
+            return 0
+        for event in events:
+            await asyncio.to_thread(app.send_task, event.task, args=event.args)
+        await db.execute(delete(OutboxEvent).where(OutboxEvent.id.in_([event.id for event in events])))
+        await db.commit()
+    logger.info(f"Outbox: отправлено {len(events)} задач")
+    return len(events)
+
+async def run_forever():
+    while True:
+        try:
+            sent = await relay_batch()
+        except Exception as e:
+            logger.error(f"Outbox relay error: {e}")
+            sent = 0
+        # Полная пачка - скорее всего, есть ещё, забираем сразу
+        if sent < settings.OUTBOX_BATCH_SIZE:
+            await asyncio.sleep(settings.OUTBOX_POLL_INTERVAL)
+
+async def main():
+    try:
+        await run_forever()
+    finally:
+        await engine.dispose()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+import asyncio
+import threading
+from celery.signals import worker_process_init, worker_process_shutdown
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from config import settings
+from celery_.logger import get_logger
+from redis_cache.redis_client import init_redis, close_redis
+
+logger = get_logger()
+
+# Асинхронная среда процесса воркера: один event loop в отдельном потоке
+# и свои пул соединений с БД и клиент Redis, привязанные к этому loop.
+# Синхронные задачи Celery отдают в неё корутины через run(), поэтому соединения
+# переиспользуются между задачами, а не создаются на каждый asyncio.run.
+
+class WorkerRuntime:
+
+    def __init__(self):
+        self.loop = None
+        self.engine = None
+        self.session_maker = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.loop is not None:
+                return
+            self.loop = asyncio.new_event_loop()
+            self._thread = threading.Thread(target=self.loop.run_forever, name="worker-runtime", daemon=True)
+            self._thread.start()
+            self.engine = create_async_engine(
+                settings.DATABASE_URL,
+                pool_size=settings.CELERY_DB_POOL_SIZE,
+                max_overflow=settings.CELERY_DB_MAX_OVERFLOW,
+                pool_pre_ping=True
+            )
+            self.session_maker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+            # Клиент Redis тоже создаётся в loop воркера
+            asyncio.run_coroutine_threadsafe(init_redis(), self.loop).result()
+            logger.info("Асинхронная среда воркера запущена")
+
+    def run(self, coro):
+        """Выполняет корутину в loop воркера и возвращает её результат."""
+        if self.loop is None:
+            # Пул solo/threads и прямой вызов задачи не шлют worker_process_init
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def stop(self):
+        with self._lock:
+            if self.loop is None:
+                return
+            for close in (self.engine.dispose, close_redis):
+                try:
+                    asyncio.run_coroutine_threadsafe(close(), self.loop).result(timeout=10)
+                except Exception as e:
+                    logger.error(f"Error closing worker runtime: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=10)
+            self.loop.close()
+            self.loop = self.engine = self.session_maker = self._thread = None
+            logger.info("Асинхронная среда воркера остановлена")
+
+runtime = WorkerRuntime()
+
+def run(coro):
+    return runtime.run(coro)
+
+def session():
+    """Новая сессия БД из пула воркера."""
+    if runtime.session_maker is None:
+        runtime.start()
+    return runtime.session_maker()
+
+@worker_process_init.connect
+def start_runtime(**kwargs):
+    # Запускается в каждом дочернем процессе уже после fork
+    runtime.start()
+
+@worker_process_shutdown.connect
+def stop_runtime(**kwargs):
+    runtime.stop()
@@ -1,51 +1,138 @@
-import asyncio
-import os
-import sys
 from datetime import datetime, timedelta
+from sqlalchemy import select, any_, cast, func, literal, Integer, DateTime
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, aggregate_order_by, insert
 from celery_.logger import get_logger
-from database import get_db
+from celery_ import runtime
+from tables.news import News
+from tables.users import User
+from tables.digests import Digest
+from redis_cache import digest_cache
 
 logger = get_logger()
 
-def get_news_for_current_week_sync():
+# Сколько новостей читается из БД за раз, когда их нужно перебрать по одной
+DIGEST_BATCH = 500
+
+def get_current_week():
+    """ISO-год и номер текущей недели по местному времени."""
+    today = datetime.now().astimezone().isocalendar()
+    return today.year, today.week
+
+def week_bounds(year: int, week: int):
+    """Начало ISO-недели (понедельник, 00:00 по местному времени) и начало следующей."""
+    monday = datetime.fromisocalendar(year, week, 1)
+    return monday.astimezone(), (monday + timedelta(days=7)).astimezone()
+
+def archive_weekly_digest_sync(year: int, week: int, on_news=None):
     """
-    Синхронная функция для получения новостей за текущую неделю из БД.
+    Собирает дайджест ISO-недели в таблицу digests и сбрасывает его JSON-тело в Redis -
+    оно соберётся из таблицы при первом чтении. Возвращает число новостей за неделю.
+    Записи дайджеста (без текста) собирает сама БД одним INSERT ... SELECT с jsonb_agg,
+    в процесс воркера строки недели не читаются.
+    on_news вызывается для каждой новости: только тогда строки с текстом читаются
+    серверным курсором порциями по DIGEST_BATCH.
     """
-    try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)  # Поднимаемся на уровень выше celery_/
-        sys.path.insert(0, project_root)
-        from services.news import NewsService
-        
-        today = datetime.now()
-        start_of_week = today - timedelta(days=today.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        
-        # Создаем асинхронную функцию для работы с БД
-        async def async_get_news():
-            async for db in get_db():
-                try:
-                    all_news = await NewsService.get_news(db)
-                    
-                    # Фильтруем новости за текущую неделю
-                    weekly_news = [
-                        news for news in all_news
-                        if start_of_week.date() <= news.publication_date.date() <= end_of_week.date()
-                    ]
-                    
-                    logger.info(f"Found {len(weekly_news)} news for current week")
-                    return weekly_news, start_of_week, end_of_week
-                    
-                except Exception as e:
-                    logger.error(f"Error in async_get_news: {e}")
-                    return [], start_of_week, end_of_week
-        
-        # Запускаем асинхронную функцию
-        return asyncio.run(async_get_news())
-        
-    except Exception as e:
-        logger.error(f"Error getting news from database: {e}")
-        today = datetime.now()
-        start_of_week = today - timedelta(days=today.weekday())
-        end_of_week = start_of_week + timedelta(days=6)
-        return [], start_of_week, end_of_week
\ No newline at end of file
+    start_of_week, end_of_week = week_bounds(year, week)
+    in_week = (News.publication_date >= start_of_week, News.publication_date < end_of_week)
+
+    async def async_archive():
+        async with runtime.session() as db:
+            items = func.coalesce(
+                func.jsonb_agg(
+                    aggregate_order_by(
+                        func.jsonb_build_object(
+                            "id", News.id,
+                            "title", News.title,
+                            "author_id", News.author_id,
+                            "publication_date", News.publication_date
+                        ),
+                        News.publication_date, News.id
+                    )
+                ),
+                cast(literal("[]"), JSONB)
+            )
+            weekly = select(
+                literal(year),
+                literal(week),
+                literal(start_of_week, DateTime(timezone=True)),
+                literal(end_of_week, DateTime(timezone=True)),
+                func.count(),
+                items
+            ).where(*in_week)
+            columns = ["year", "week", "period_start", "period_end", "news_count", "items"]
+            # Повторная сборка недели (например, при догрузке архива) перезаписывает запись
+            stmt = insert(Digest).from_select(columns, weekly)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[Digest.year, Digest.week],
+                set_={**{key: stmt.excluded[key] for key in columns if key not in ("year", "week")},
+                      "created_at": func.now()}
+            ).returning(Digest.news_count)
+            news_count = (await db.execute(stmt)).scalar_one()
+            await db.commit()
+            logger.info(f"Found {news_count} news for week {year}-W{week:02d}")
+
+            if on_news:
+                result = await db.stream(
+                    select(News.id, News.title, News.content, News.author_id, News.publication_date)
+                    .where(*in_week)
+                    .order_by(News.publication_date, News.id)
+                    .execution_options(yield_per=DIGEST_BATCH)
+                )
+                async for news in result:
+                    on_news(news)
+
+        await digest_cache.delete_digest_body(year, week)
+        return news_count
+
+    return runtime.run(async_archive())
+
+def stream_recipient_chunks_sync(news_id: int, chunk_size: int, on_chunk):
+    """
+    Читает id пользователей из БД порциями по chunk_size серверным курсором
+    и передаёт каждую порцию в on_chunk. Возвращает число порций
+    или None, если новости уже нет (например, её успели удалить).
+    """
+    async def async_stream():
+        async with runtime.session() as db:
+            result = await db.execute(select(News.id).where(News.id == news_id))
+            if result.scalar_one_or_none() is None:
+                return None
+            chunks = 0
+            user_ids = await db.stream_scalars(
+                select(User.id).order_by(User.id).execution_options(yield_per=chunk_size)
+            )
+            async for chunk in user_ids.partitions():
+                on_chunk(list(chunk))
+                chunks += 1
+            return chunks
+
+    return runtime.run(async_stream())
+
+def load_email_batch_sync(news_id: int, user_ids: list):
+    """
+    Данные для одной порции рассылки: (новость словарём или None, список получателей).
+    Получатели читаются одним запросом.
+    """
+    async def async_load():
+        async with runtime.session() as db:
+            result = await db.execute(select(News).where(News.id == news_id))
+            news = result.scalar_one_or_none()
+            if news is None:
+                return None, []
+            news_data = {
+                "id": news.id,
+                "title": news.title,
+                "content": news.content,
+                "publication_date": news.publication_date,
+                "author_id": news.author_id,
+                "cover_image": news.cover_image
+            }
+            result = await db.execute(
+                select(User.id, User.name, User.email)
+                .where(User.id == any_(cast(user_ids, ARRAY(Integer))))
+                .order_by(User.id)
+            )
+            users_data = [{"id": user.id, "name": user.name, "email": user.email} for user in result]
+            return news_data, users_data
+
+    return runtime.run(async_load())
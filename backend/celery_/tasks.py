@@ -1,11 +1,18 @@
-import time
 import random
+from itertools import count
 import signal
 import sys
-from celery_.app import create_celery_app
-from datetime import datetime
+from celery import group
+from celery_.app import create_celery_app, PAYLOAD_COMPRESSION
+from datetime import datetime, timedelta
 from celery_.logger import get_logger
-from celery_.service import get_news_for_current_week_sync
+from celery_.mailer import deliver
+from celery_ import idempotency
+from celery_ import metrics  # сигналы для метрик задержки и времени выполнения по очередям
+from celery_.service import (
+    get_current_week, week_bounds, archive_weekly_digest_sync, stream_recipient_chunks_sync, load_email_batch_sync
+)
+from config import settings
 
 logger = get_logger()
 
@@ -27,13 +34,62 @@ def signal_handler(signum, frame):
 signal.signal(signal.SIGTERM, signal_handler)
 signal.signal(signal.SIGINT, signal_handler)
 
-# Задача запускается при создании новости
-@app.task(name='celery_.tasks.send_email_task', bind=True, max_retries=3)
-def send_email_task(self, users_data: list, news_data: dict):
+# Задача запускается после создания новости: раздаёт рассылку порциями получателей
+@app.task(name='celery_.tasks.send_news_emails_task')
+def send_news_emails_task(news_id: int, idempotency_key: str = None):
+    # outbox доставляет событие как минимум один раз - повторную раздачу пропускаем
+    idempotency_key = idempotency_key or f"send_news_emails:{news_id}"
+    claim = idempotency.claim("send_news_emails_task", idempotency_key)
+    if claim is None:
+        logger.info(f"Рассылка новости {news_id} уже раздана или раздаётся, повтор пропущен")
+        return {"status": "duplicate", "news_id": news_id}
+    signatures = []
+
+    def dispatch():
+        # Порции уходят в брокер группами, чтобы не держать в памяти всю рассылку
+        group(list(signatures)).apply_async()
+        signatures.clear()
+
+    def on_chunk(user_ids: list):
+        signatures.append(send_email_task.s(news_id, user_ids))
+        if len(signatures) >= settings.EMAIL_GROUP_SIZE:
+            dispatch()
+
+    try:
+        chunks = stream_recipient_chunks_sync(news_id, settings.EMAIL_CHUNK_SIZE, on_chunk)
+        if signatures:
+            dispatch()
+    except Exception:
+        # Повторная доставка события должна раздать рассылку заново
+        idempotency.release(idempotency_key, claim)
+        raise
+    idempotency.mark_done(idempotency_key)
+    if chunks is None:
+        logger.info(f"Новость {news_id} не найдена, рассылка отменена")
+        return {"status": "skipped", "news_id": news_id}
+    logger.info(f"Рассылка новости {news_id} разбита на {chunks} задач")
+    return {"status": "dispatched", "news_id": news_id, "chunks": chunks}
+
+# Одна порция рассылки: в сообщении только id, данные воркер читает из БД одним запросом
+@app.task(name='celery_.tasks.send_email_task', bind=True, max_retries=3, compression=PAYLOAD_COMPRESSION)
+def send_email_task(self, news_id: int, user_ids: list, idempotency_key: str = None):
+    idempotency_key = idempotency_key or idempotency.email_batch_key(news_id, user_ids)
+    claim = idempotency.claim("send_email_task", idempotency_key)
+    if claim is None:
+        logger.info(f"Порция рассылки {idempotency_key} уже выполнена или выполняется, повтор пропущен")
+        return {"status": "duplicate", "count": 0}
+    users_data = []
     try:
         if not self.request.called_directly:
             signal.signal(signal.SIGTERM, signal_handler)
             signal.signal(signal.SIGINT, signal_handler)
+        news_data, users_data = load_email_batch_sync(news_id, user_ids)
+        if news_data is None:
+            logger.info(f"Новость {news_id} не найдена, порция рассылки пропущена")
+            return {"status": "skipped", "count": 0}
+        # Получателей захватываем до отправки: дошедшие письма второй раз не шлём,
+        # а тех, кому письмо сейчас отправляет другой запуск, пропускаем
+        users_data = idempotency.claim_recipients(news_id, users_data, claim)
         logger.info(f"\n\n")
         logger.info("=" * 80)
         logger.info(f"Начинаю рассылку {len(users_data)} пользователям")
@@ -43,20 +99,16 @@ def send_email_task(self, users_data: list, news_data: dict):
         logger.info(f"Заголовок: {news_data['title']}")
         logger.info(f"ID автора: {news_data['author_id']}")
         logger.info(f"Дата публикации: {news_data['publication_date'].date().strftime('%d.%m.%Y')}")
-        logger.info(f"Содержание: {news_data['content']}")
         logger.info("─" * 80)
-        for user in users_data:
-            logger.info(f"Отправляю рассылку пользовелю {user['name']}")
-        
-        if random.random() < 0.3:
-            raise Exception("Симулирую ошибки отправки")
-        
-        time.sleep(2)
-        logger.info(f"Рассылка успешна отправлена {len(users_data)} пользователям")
-        
-        return {"status": "success", "count": len(users_data)}
-        
+
+        # Ошибки отдельных писем deliver не бросает, а возвращает - до сюда доходят
+        # только ошибки до начала отправки, поэтому повтор всей порции никого не задублирует
+        failed = deliver(news_data, users_data, on_sent=lambda sent: idempotency.mark_sent(news_id, sent))
+
     except Exception as exc:
+        # Повтор уходит с тем же ключом - снимаем захваты, отправленным письмам это не мешает
+        idempotency.release_recipients(news_id, users_data, claim)
+        idempotency.release(idempotency_key, claim)
         retry_count = self.request.retries
         backoff_delay = calculate_backoff(retry_count)
         
@@ -66,48 +118,81 @@ def send_email_task(self, users_data: list, news_data: dict):
         else:
             logger.error(f"Failed after {retry_count + 1} attempts: {exc}")
             return {"status": "failed", "error": str(exc)}
-        
+
+    # Отметка ставится и перед повтором: повтор уходит отдельным сообщением со своим ключом,
+    # а это сообщение, доставленное ещё раз, уже ничего не должно делать
+    idempotency.mark_done(idempotency_key)
+    sent_count = len(users_data) - len(failed)
+    if not failed:
+        logger.info(f"Рассылка успешна отправлена {sent_count} пользователям")
+        return {"status": "success", "count": sent_count}
+
+    # Повторяем только тем, кому письмо не ушло
+    idempotency.release_recipients(news_id, failed, claim)
+    failed_ids = [user["id"] for user in failed]
+    retry_count = self.request.retries
+    if retry_count < self.max_retries:
+        backoff_delay = calculate_backoff(retry_count)
+        logger.warning(
+            f"Не доставлено {len(failed_ids)} из {len(users_data)}, "
+            f"retry {retry_count + 1}/{self.max_retries} in {backoff_delay}s"
+        )
+        raise self.retry(
+            args=(news_id, failed_ids),
+            kwargs={"idempotency_key": f"{idempotency_key}:retry{retry_count + 1}"},
+            countdown=backoff_delay
+        )
+    logger.error(f"Не доставлено {len(failed_ids)} писем после {retry_count + 1} попыток")
+    return {"status": "partial", "count": sent_count, "failed": failed_ids}
+
 # Задача которая запускается по воскресеньям и логирует новости за неделю 
-@app.task(name='celery_.tasks.sunday_reminder_task')
+# Итог отчёта сохраняется в бэкенде результатов, чтобы его можно было посмотреть по id задачи
+@app.task(name='celery_.tasks.sunday_reminder_task', ignore_result=False)
 def sunday_reminder_task():
     current_time = datetime.now()
     
     try:
-        # Получаем новости за текущую неделю
-        weekly_news, start_of_week, end_of_week = get_news_for_current_week_sync()
-        
+        year, week = get_current_week()
+        start_of_week, end_of_week = week_bounds(year, week)
+        # Последний день недели для отчёта, сам end_of_week - начало следующей
+        last_day = end_of_week - timedelta(days=1)
+
         # Логируем заголовок отчета
         logger.info(f"\n\n")
         logger.info("=" * 80)
         logger.info("📊 ЕЖЕНЕДЕЛЬНЫЙ ДАЙДЖЕСТ НОВОСТЕЙ")
         logger.info("=" * 80)
-        logger.info(f"Период: {start_of_week.strftime('%d.%m.%Y')} - {end_of_week.strftime('%d.%m.%Y')}")
+        logger.info(f"Период: {start_of_week.strftime('%d.%m.%Y')} - {last_day.strftime('%d.%m.%Y')}")
         logger.info(f"Дата формирования: {current_time.strftime('%d.%m.%Y %H:%M:%S')}")
-        logger.info(f"Всего новостей за неделю: {len(weekly_news)}")
         logger.info("=" * 80)
-        
-        if not weekly_news:
+
+        # Дайджест собирается по мере чтения: в памяти только текущая новость
+        numbers = count(1)
+
+        def log_news(news):
+            logger.info(f"📰 Новость #{next(numbers)}")
+            logger.info("─" * 80)
+            logger.info(f"Заголовок: {news.title}")
+            logger.info(f"Автор ID: {news.author_id}")
+            logger.info(f"Дата публикации: {news.publication_date.strftime('%d.%m.%Y')}")
+            logger.info(f"Содержание: {news.content}")
+            logger.info("─" * 80)
+
+        # Дайджест сохраняется в архив и сразу доступен через GET /digests/{year}-W{week}
+        news_count = archive_weekly_digest_sync(year, week, log_news)
+        if not news_count:
             logger.info("ℹ️ За эту неделю новостей не было")
-        else:
-            # Логируем каждую новость
-            for i, news in enumerate(weekly_news, 1):
-                logger.info(f"📰 Новость #{i}")
-                logger.info("─" * 80)
-                logger.info(f"Заголовок: {news.title}")
-                logger.info(f"Автор ID: {news.author_id}")
-                logger.info(f"Дата публикации: {news.publication_date.strftime('%d.%m.%Y')}")
-                logger.info(f"Содержание: {news.content}")
-                logger.info("─" * 80)
         
         # Статистика в конце
-        logger.info(f"📈 Статистика: {len(weekly_news)} новостей за неделю")
+        logger.info(f"📈 Статистика: {news_count} новостей за неделю")
         logger.info("=" * 80)
         
         return {
             "status": "completed", 
             "message": "Weekly digest generated successfully",
-            "period": f"{start_of_week.strftime('%Y-%m-%d')} - {end_of_week.strftime('%Y-%m-%d')}",
-            "news_count": len(weekly_news)
+            "period": f"{start_of_week.strftime('%Y-%m-%d')} - {last_day.strftime('%Y-%m-%d')}",
+            "week": f"{year}-W{week:02d}",
+            "news_count": news_count
         }
         
     except Exception as e:
@@ -117,4 +202,26 @@ def sunday_reminder_task():
             "status": "failed", 
             "error": str(e),
             "timestamp": current_time.isoformat()
-        }
\ No newline at end of file
+        }
+
+# Сборка архивного дайджеста одной недели
+@app.task(name='celery_.tasks.archive_digest_task')
+def archive_digest_task(year: int, week: int):
+    news_count = archive_weekly_digest_sync(year, week)
+    return {"week": f"{year}-W{week:02d}", "news_count": news_count}
+
+# Догрузка архива за диапазон недель: каждая неделя - отдельная задача,
+# и воркеры собирают их параллельно
+@app.task(name='celery_.tasks.backfill_digests_task')
+def backfill_digests_task(start_year: int, start_week: int, end_year: int, end_week: int):
+    monday = datetime.fromisocalendar(start_year, start_week, 1)
+    last_monday = datetime.fromisocalendar(end_year, end_week, 1)
+    weeks = []
+    while monday <= last_monday:
+        iso = monday.isocalendar()
+        weeks.append((iso.year, iso.week))
+        monday += timedelta(days=7)
+    if weeks:
+        group(archive_digest_task.s(year, week) for year, week in weeks).apply_async()
+    logger.info(f"Догрузка дайджестов: {len(weeks)} недель поставлено в очередь")
+    return {"status": "dispatched", "weeks": len(weeks)}
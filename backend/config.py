@@ -14,4 +14,79 @@ class Settings:
     GITHUB_CLIENT_SECRET: str= os.getenv("GITHUB_CLIEND_SECRET")
     GITHUB_REDIRECT_URI: str = os.getenv('GITHUB_REDIRECT_URI')
 
+    # Параметры Argon2 для паролей. При их изменении хеш пересчитывается при следующем входе
+    ARGON2_TIME_COST: int = int(os.getenv("ARGON2_TIME_COST", 3))
+    ARGON2_MEMORY_COST: int = int(os.getenv("ARGON2_MEMORY_COST", 65536))
+    ARGON2_PARALLELISM: int = int(os.getenv("ARGON2_PARALLELISM", 4))
+    # Пул потоков для хеширования паролей в каждом процессе и сколько запросов
+    # может ждать его, прежде чем логин начнёт отвечать 503
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING: int = int(os.getenv("PASSWORD_HASH_MAX_PENDING", 32))
+
+    # Refresh-сессии: как часто и какими пачками изменения из Redis переносятся в refresh_sessions
+    # и как часто из таблицы удаляются истёкшие сессии
+    SESSION_WRITE_BEHIND_INTERVAL: float = float(os.getenv("SESSION_WRITE_BEHIND_INTERVAL", 1.0))
+    SESSION_WRITE_BEHIND_BATCH: int = int(os.getenv("SESSION_WRITE_BEHIND_BATCH", 500))
+    SESSION_CLEANUP_INTERVAL: int = int(os.getenv("SESSION_CLEANUP_INTERVAL", 3600))
+
+    # Реализация JSON для кеша и ответов API: orjson, msgspec или json
+    JSON_CODEC: str = os.getenv("JSON_CODEC", "orjson")
+
+    # Кеш: после мягкого срока запись отдаётся и обновляется в фоне,
+    # после жёсткого - удаляется из Redis
+    CACHE_SOFT_TTL: int = int(os.getenv("CACHE_SOFT_TTL", 60))
+    CACHE_HARD_TTL: int = int(os.getenv("CACHE_HARD_TTL", 300))
+    # Размеры первых страниц ленты, которые обновляются заранее, до истечения срока
+    HOT_NEWS_PAGE_LIMITS: list = [int(limit) for limit in os.getenv("HOT_NEWS_PAGE_LIMITS", "100").split(",") if limit]
+    HOT_KEYS_REFRESH_INTERVAL: int = int(os.getenv("HOT_KEYS_REFRESH_INTERVAL", 15))
+
+    # Relay outbox: сколько задач забирается за раз и как часто опрашивается пустая таблица
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", 1.0))
+
+    # Сколько секунд хранятся отметки о выполненных задачах и отправленных письмах
+    IDEMPOTENCY_TTL: int = int(os.getenv("IDEMPOTENCY_TTL", 7 * 86400))
+    # Сколько секунд держится захват задачи или получателя, пока идёт выполнение.
+    # Должно быть меньше visibility_timeout брокера (3600)
+    IDEMPOTENCY_LEASE: int = int(os.getenv("IDEMPOTENCY_LEASE", 1800))
+
+    # Порт, на котором celery_.metrics_exporter отдаёт метрики очередей и воркеров
+    CELERY_METRICS_PORT: int = int(os.getenv("CELERY_METRICS_PORT", 9092))
+
+    # Пул соединений с БД в каждом процессе воркера Celery
+    CELERY_DB_POOL_SIZE: int = int(os.getenv("CELERY_DB_POOL_SIZE", 5))
+    CELERY_DB_MAX_OVERFLOW: int = int(os.getenv("CELERY_DB_MAX_OVERFLOW", 5))
+
+    # Рассылка о новой новости: сколько получателей в одной задаче
+    # и сколько таких задач отправляется в брокер одной группой
+    EMAIL_CHUNK_SIZE: int = int(os.getenv("EMAIL_CHUNK_SIZE", 500))
+    EMAIL_GROUP_SIZE: int = int(os.getenv("EMAIL_GROUP_SIZE", 50))
+
+    # SMTP для рассылки. Без SMTP_HOST письма только пишутся в лог задач
+    SMTP_HOST: str = os.getenv("SMTP_HOST")
+    SMTP_PORT: int = int(os.getenv("SMTP_PORT", 25))
+    SMTP_USER: str = os.getenv("SMTP_USER")
+    SMTP_PASSWORD: str = os.getenv("SMTP_PASSWORD")
+    SMTP_STARTTLS: bool = os.getenv("SMTP_STARTTLS", "false").lower() == "true"
+    SMTP_TIMEOUT: int = int(os.getenv("SMTP_TIMEOUT", 10))
+    # Сколько соединений с SMTP держит один процесс воркера - столько писем уходит параллельно
+    SMTP_POOL_SIZE: int = int(os.getenv("SMTP_POOL_SIZE", 4))
+    EMAIL_FROM: str = os.getenv("EMAIL_FROM", "news@example.com")
+    # Сколько писем отправляется параллельно одной пачкой внутри задачи
+    EMAIL_BATCH_SIZE: int = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+
+    # Размер страницы комментариев по умолчанию
+    COMMENTS_PAGE_SIZE: int = int(os.getenv("COMMENTS_PAGE_SIZE", 50))
+
+    # Сколько секунд живёт закешированная выдача поиска
+    SEARCH_CACHE_TTL: int = int(os.getenv("SEARCH_CACHE_TTL", 30))
+
+    # Cache-Control для ответов с ETag, отдельно для каждого маршрута.
+    # no-cache - клиент хранит ответ, но перед использованием сверяет ETag
+    CACHE_CONTROL: dict = {
+        "news_list": os.getenv("CACHE_CONTROL_NEWS_LIST", "no-cache"),
+        "news_item": os.getenv("CACHE_CONTROL_NEWS_ITEM", "no-cache"),
+        "news_comments": os.getenv("CACHE_CONTROL_NEWS_COMMENTS", "no-cache"),
+    }
+
 settings = Settings()
\ No newline at end of file
@@ -1,16 +1,23 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
-from routers import users_router, news_router, comments_router, metrics_router
+from routers import users_router, news_router, comments_router, metrics_router, digests_router
 from auth.router import router as auth_router
 from contextlib import asynccontextmanager
+from serialization import CodecJSONResponse
 from redis_cache.redis_client import init_redis, close_redis
+from redis_cache.local_cache import start_invalidation_listener, stop_invalidation_listener
+from services.news import NewsService
+from auth.sessions import SessionStore
 
 @asynccontextmanager
 async def lifespan(app):
     print("Starting up...")
     try:
         await init_redis()
+        await start_invalidation_listener()
+        NewsService.start_hot_pages_refresher()
+        SessionStore.start_write_behind()
         print("Redis initialized successfully")
     except Exception as e:
         print(f"Failed to initialize Redis: {e}")
@@ -20,12 +27,15 @@ async def lifespan(app):
     
     print("Shutting down...")
     try:
+        await NewsService.stop_hot_pages_refresher()
+        await SessionStore.stop_write_behind()
+        await stop_invalidation_listener()
         await close_redis()
         print("Redis connection closed")
     except Exception as e:
         print(f"Error while closing Redis: {e}")
 
-app = FastAPI(title="News API", lifespan=lifespan)
+app = FastAPI(title="News API", lifespan=lifespan, default_response_class=CodecJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -40,6 +50,7 @@ app.include_router(users_router)
 app.include_router(news_router)
 app.include_router(comments_router)
 app.include_router(metrics_router)
+app.include_router(digests_router)
 
 @app.get("/")
 def read_root():
@@ -0,0 +1,19 @@
+"""006_add_news_feed_index"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '006'
+down_revision: Union[str, Sequence[str], None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс под keyset-пагинацию ленты по (publication_date, id)
+    op.create_index('ix_news_publication_date_id', 'news', ['publication_date', 'id'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index('ix_news_publication_date_id', table_name='news')
@@ -0,0 +1,30 @@
+"""008_add_comment_count"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '008'
+down_revision: Union[str, Sequence[str], None] = '007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Индекс под keyset-пагинацию комментариев новости
+    op.create_index(
+        'ix_comments_news_id_publication_date_id', 'comments',
+        ['news_id', 'publication_date', 'id'], unique=False
+    )
+    # Денормализованное число комментариев, заполняем по уже существующим
+    op.add_column('news', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute("""
+        UPDATE news SET comment_count = counts.total
+        FROM (SELECT news_id, COUNT(*) AS total FROM comments GROUP BY news_id) AS counts
+        WHERE news.id = counts.news_id
+    """)
+
+def downgrade() -> None:
+    op.drop_column('news', 'comment_count')
+    op.drop_index('ix_comments_news_id_publication_date_id', table_name='comments')
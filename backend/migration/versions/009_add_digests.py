@@ -0,0 +1,29 @@
+"""009_add_digests"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = '009'
+down_revision: Union[str, Sequence[str], None] = '008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Архив еженедельных дайджестов, по одной записи на ISO-неделю
+    op.create_table('digests',
+        sa.Column('year', sa.Integer(), nullable=False),
+        sa.Column('week', sa.Integer(), nullable=False),
+        sa.Column('period_start', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('period_end', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('news_count', sa.Integer(), nullable=False),
+        sa.Column('items', postgresql.JSONB(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('year', 'week')
+    )
+
+def downgrade() -> None:
+    op.drop_table('digests')
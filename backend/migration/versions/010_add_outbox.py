@@ -0,0 +1,26 @@
+"""010_add_outbox"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+revision: str = '010'
+down_revision: Union[str, Sequence[str], None] = '009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Задачи Celery, записанные в одной транзакции с данными; их отправляет relay
+    op.create_table('outbox',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('task', sa.String(length=200), nullable=False),
+        sa.Column('args', postgresql.JSONB(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+def downgrade() -> None:
+    op.drop_table('outbox')
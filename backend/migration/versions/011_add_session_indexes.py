@@ -0,0 +1,20 @@
+"""011_add_session_indexes"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = '011'
+down_revision: Union[str, Sequence[str], None] = '010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Сессии пользователя читаются из БД, когда их нет в Redis, истёкшие удаляются фоном
+    op.create_index(op.f('ix_refresh_sessions_user_id'), 'refresh_sessions', ['user_id'], unique=False)
+    op.create_index(op.f('ix_refresh_sessions_expires_at'), 'refresh_sessions', ['expires_at'], unique=False)
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_refresh_sessions_expires_at'), table_name='refresh_sessions')
+    op.drop_index(op.f('ix_refresh_sessions_user_id'), table_name='refresh_sessions')
@@ -0,0 +1,19 @@
+"""012_add_news_row_version"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = '012'
+down_revision: Union[str, Sequence[str], None] = '011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Версия строки новости: кеш не перезаписывает хеш новости данными старее записанных
+    op.add_column('news', sa.Column('row_version', sa.Integer(), server_default='1', nullable=False))
+
+def downgrade() -> None:
+    op.drop_column('news', 'row_version')
@@ -39,6 +39,34 @@ REQUEST_COUNT = Counter('http_requests_total', 'Total HTTP requests',
                        ['method', 'endpoint', 'status_code'])
 REQUEST_LATENCY = Histogram('http_request_duration_seconds', 'HTTP request latency')
 
+LOCAL_CACHE_HITS = Counter('local_cache_hits_total', 'In-process cache hits', ['cache'])
+LOCAL_CACHE_MISSES = Counter('local_cache_misses_total', 'In-process cache misses', ['cache'])
+LOCAL_CACHE_EVICTIONS = Counter('local_cache_evictions_total', 'In-process cache evictions',
+                                ['cache', 'reason'])
+LOCAL_CACHE_SIZE = Gauge('local_cache_size', 'In-process cache entries', ['cache'])
+
+PASSWORD_HASH_DURATION = Histogram('password_hash_duration_seconds', 'Argon2 hash or verify time', ['operation'])
+PASSWORD_HASH_QUEUE_WAIT = Histogram('password_hash_queue_wait_seconds',
+                                     'Time a password operation waits for the hashing pool', ['operation'])
+PASSWORD_HASH_PENDING = Gauge('password_hash_pending', 'Password operations queued or running in the hashing pool')
+PASSWORD_HASH_REJECTED = Counter('password_hash_rejected_total',
+                                 'Password operations rejected because the hashing queue is full', ['operation'])
+
+CELERY_TASK_QUEUE_WAIT = Histogram('celery_task_queue_wait_seconds',
+                                   'Time between publishing a Celery task and a worker starting it', ['queue', 'task'])
+CELERY_TASK_RUNTIME = Histogram('celery_task_runtime_seconds', 'Celery task execution time', ['queue', 'task'])
+
+TASK_DUPLICATES_SUPPRESSED = Counter('task_duplicates_suppressed_total',
+                                     'Repeated Celery task executions skipped by idempotency markers', ['task'])
+
+EMAIL_SENT = Counter('email_sent_total', 'Emails delivered')
+EMAIL_FAILED = Counter('email_failed_total', 'Emails not delivered', ['reason'])
+EMAIL_BATCH_DURATION = Histogram('email_batch_duration_seconds', 'Time to deliver one email batch')
+EMAIL_BATCH_THROUGHPUT = Histogram('email_batch_throughput', 'Emails per second within one batch',
+                                   buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+EMAIL_BATCH_FAILED_RECIPIENTS = Histogram('email_batch_failed_recipients', 'Failed recipients per batch',
+                                          buckets=(0, 1, 2, 5, 10, 25, 50, 100))
+
 # ===== Middleware для логирования запросов =====
 class MonitoringMiddleware(BaseHTTPMiddleware):
     async def dispatch(self, request: Request, call_next):
@@ -0,0 +1,27 @@
+from redis_cache.redis_client import get_redis
+from config import settings
+
+# Кешируется только первая страница комментариев к новости - её читают чаще всего.
+# Ключ содержит версию комментариев, поэтому после записи старая страница
+# перестаёт читаться и просто истекает.
+# Ключ - comments:{news_id}:first:{версия}:{limit}
+
+def first_page_key(news_id: int, version: str, limit: int) -> str:
+    return f"comments:{news_id}:first:{version}:{limit}"
+
+async def get_first_page(news_id: int, version: str, limit: int):
+    """Возвращает (тело ответа, курсор) или None."""
+    redis_client = await get_redis()
+    payload = await redis_client.get(first_page_key(news_id, version, limit))
+    if payload is None:
+        return None
+    next_cursor, _, body = payload.partition("\n")
+    return body, next_cursor or None
+
+async def set_first_page(news_id: int, version: str, limit: int, body: str, next_cursor: str = None):
+    redis_client = await get_redis()
+    await redis_client.set(
+        first_page_key(news_id, version, limit),
+        f"{next_cursor or ''}\n{body}",
+        ex=settings.CACHE_HARD_TTL
+    )
@@ -0,0 +1,20 @@
+from redis_cache.redis_client import get_redis
+
+# Готовое JSON-тело дайджеста недели. Прошедшие недели не меняются,
+# поэтому запись живёт долго, а при потере собирается заново из таблицы digests
+DIGEST_TTL = 7 * 86400
+
+def digest_key(year: int, week: int) -> str:
+    return f"digest:{year}-W{week:02d}"
+
+async def get_digest_body(year: int, week: int):
+    redis_client = await get_redis()
+    return await redis_client.get(digest_key(year, week))
+
+async def set_digest_body(year: int, week: int, body: str):
+    redis_client = await get_redis()
+    await redis_client.set(digest_key(year, week), body, ex=DIGEST_TTL)
+
+async def delete_digest_body(year: int, week: int):
+    redis_client = await get_redis()
+    await redis_client.delete(digest_key(year, week))
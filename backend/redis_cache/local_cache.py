@@ -0,0 +1,134 @@
+import asyncio
+import time
+from collections import OrderedDict
+from redis_cache.redis_client import get_redis
+from monitoring.monitoring import (
+    logger,
+    LOCAL_CACHE_HITS,
+    LOCAL_CACHE_MISSES,
+    LOCAL_CACHE_EVICTIONS,
+    LOCAL_CACHE_SIZE
+)
+
+# Канал, по которому воркеры сообщают друг другу об изменённых записях.
+# Сообщение имеет вид "{имя кеша}:{ключ}"
+INVALIDATION_CHANNEL = "cache:invalidate"
+# Пауза перед повторной подпиской после обрыва соединения
+RESUBSCRIBE_DELAY = 1
+
+class LocalCache:
+    """Ограниченный по размеру LRU-кеш в памяти процесса с временем жизни записей."""
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        # Растёт при каждой инвалидации. Значение, прочитанное из Redis до
+        # инвалидации, могло устареть, поэтому его не кладём
+        self._epoch = 0
+        _caches[name] = self
+
+    def token(self) -> int:
+        return self._epoch
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            LOCAL_CACHE_MISSES.labels(cache=self.name).inc()
+            return None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            LOCAL_CACHE_EVICTIONS.labels(cache=self.name, reason="expired").inc()
+            LOCAL_CACHE_SIZE.labels(cache=self.name).set(len(self._data))
+            LOCAL_CACHE_MISSES.labels(cache=self.name).inc()
+            return None
+        self._data.move_to_end(key)
+        LOCAL_CACHE_HITS.labels(cache=self.name).inc()
+        return value
+
+    def set(self, key, value, token: int = None, ttl: float = None):
+        """ttl меньше ttl кеша укорачивает жизнь одной записи."""
+        if token is not None and token != self._epoch:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        self._data[key] = (value, time.monotonic() + ttl)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            LOCAL_CACHE_EVICTIONS.labels(cache=self.name, reason="size").inc()
+        LOCAL_CACHE_SIZE.labels(cache=self.name).set(len(self._data))
+
+    def delete(self, key):
+        self._epoch += 1
+        if self._data.pop(key, None) is not None:
+            LOCAL_CACHE_EVICTIONS.labels(cache=self.name, reason="invalidated").inc()
+            LOCAL_CACHE_SIZE.labels(cache=self.name).set(len(self._data))
+
+    def clear(self):
+        self._epoch += 1
+        self._data.clear()
+        LOCAL_CACHE_SIZE.labels(cache=self.name).set(0)
+
+_caches = {}
+
+# Записи живут недолго на случай, если сообщение об инвалидации потерялось
+news_local_cache = LocalCache("news", maxsize=1024, ttl=30)
+users_local_cache = LocalCache("users", maxsize=4096, ttl=30)
+# Проверенные claims access-токенов по хешу токена, запись живёт не дольше exp токена
+claims_local_cache = LocalCache("claims", maxsize=16384, ttl=300)
+
+def _evict(message: str):
+    name, _, key = message.partition(":")
+    cache = _caches.get(name)
+    if cache is not None:
+        cache.delete(key)
+
+async def invalidate(cache: LocalCache, key):
+    """Удаляет запись из локального кеша этого и всех остальных воркеров."""
+    cache.delete(str(key))
+    redis_client = await get_redis()
+    await redis_client.publish(INVALIDATION_CHANNEL, f"{cache.name}:{key}")
+
+async def _listen():
+    while True:
+        redis_client = await get_redis()
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Пока подписки не было, сообщения могли потеряться
+            for cache in _caches.values():
+                cache.clear()
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    _evict(message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(
+                "cache_invalidation_listener_failed",
+                error=str(e)
+            )
+            await asyncio.sleep(RESUBSCRIBE_DELAY)
+        finally:
+            await pubsub.aclose()
+
+_listener_task = None
+
+async def start_invalidation_listener():
+    global _listener_task
+    if _listener_task is None:
+        _listener_task = asyncio.create_task(_listen())
+
+async def stop_invalidation_listener():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
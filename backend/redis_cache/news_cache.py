@@ -0,0 +1,393 @@
+import base64
+import re
+from datetime import datetime, timedelta, timezone
+from redis_cache.redis_client import get_redis, get_script
+from redis_cache.local_cache import news_local_cache, invalidate
+from redis_cache.single_flight import acquire_lock, release_lock
+from redis_cache import swr
+from redis_cache.versions import VERSION_LUA, news_version_key, get_version
+import schemas.news as news_schemas
+
+# Каждая новость хранится в отдельном хеше news:{id},
+# а порядок - в отсортированном множестве news:index.
+# Все элементы множества имеют score 0, а member имеет вид
+# "{микросекунды даты публикации}:{id}" с ведущими нулями, поэтому
+# лексикографический порядок совпадает с порядком (publication_date, id).
+NEWS_INDEX_KEY = "news:index"
+# Временный индекс, который собирается при перестроении
+NEWS_INDEX_TMP_KEY = "news:index:rebuild"
+# Маркер того, что индекс полностью построен из БД
+NEWS_INDEX_READY_KEY = "news:index:ready"
+# Заглушка, чтобы временный индекс существовал с самого начала перестроения
+NEWS_INDEX_PLACEHOLDER = ""
+# Версия списка новостей: меняется при любой записи, страницы кешируются под ней,
+# она же - ETag ленты
+NEWS_VERSION_KEY = "news:version"
+NEWS_PAGE_PREFIX = "news:page"
+
+# Через час индекс перестраивается из БД заново
+NEWS_INDEX_READY_TTL = 3600
+# Удалённые новости помечаются, чтобы перестроение не вернуло их обратно
+NEWS_TOMBSTONE_TTL = 300
+NEWS_REBUILD_BATCH = 500
+NEWS_REBUILD_LOCK_TTL_MS = 60000
+
+NEWS_FIELDS = ("id", "title", "content", "publication_date", "author_id", "cover_image", "comment_count")
+
+# Хеш новости живёт сутки: индекс перестраивается каждый час и продлевает хеши
+# существующих новостей, а хеши удалённых мимо кеша новостей истекают сами
+NEWS_TTL = 86400
+
+# Версия строки новости в БД (row_version) растёт при каждом изменении строки.
+# Скрипты не перезаписывают хеш данными старее уже записанных: если два обновления
+# дошли до Redis не в том порядке, в кеше остаётся более новое
+# Хеш без версии (записанный до её появления) считается старее любой строки из БД
+ROW_VERSION_LUA = """
+local function cached_row_version(key)
+    return tonumber(redis.call('HGET', key, '_row_version') or '-1')
+end
+"""
+
+# KEYS: news:{id}, news:index, news:index:rebuild, news:version, news:{id}:version
+# ARGV: member, версия строки, время жизни хеша, затем пары поле/значение
+UPSERT_NEWS_SCRIPT = VERSION_LUA + ROW_VERSION_LUA + """
+if cached_row_version(KEYS[1]) > tonumber(ARGV[2]) then
+    return 0
+end
+local old = redis.call('HGET', KEYS[1], '_member')
+if old and old ~= ARGV[1] then
+    redis.call('ZREM', KEYS[2], old)
+    redis.call('ZREM', KEYS[3], old)
+end
+redis.call('DEL', KEYS[1])
+redis.call('HSET', KEYS[1], '_member', ARGV[1], '_row_version', ARGV[2], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], 0, ARGV[1])
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    redis.call('ZADD', KEYS[3], 0, ARGV[1])
+end
+bump_version(KEYS[4])
+bump_version(KEYS[5])
+return 1
+"""
+
+# KEYS: news:{id}, news:{id}:version
+# ARGV: версия строки, затем пары поле/значение
+# Меняет поля новости, не трогая индекс и версию ленты
+UPDATE_NEWS_SCRIPT = VERSION_LUA + ROW_VERSION_LUA + """
+if cached_row_version(KEYS[1]) > tonumber(ARGV[1]) then
+    return 0
+end
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('HSET', KEYS[1], '_row_version', ARGV[1], unpack(ARGV, 2))
+end
+bump_version(KEYS[2])
+return 1
+"""
+
+# KEYS: news:{id}, индекс (основной или временный), надгробие
+# ARGV: member, версия строки, время жизни хеша, затем пары поле/значение
+# Не перезаписывает более свежие данные и не возвращает удалённые новости
+FILL_NEWS_SCRIPT = ROW_VERSION_LUA + """
+if redis.call('EXISTS', KEYS[3]) == 1 then
+    return 0
+end
+if cached_row_version(KEYS[1]) < tonumber(ARGV[2]) then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], '_member', ARGV[1], '_row_version', ARGV[2], unpack(ARGV, 4))
+end
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+redis.call('ZADD', KEYS[2], 0, ARGV[1])
+return 1
+"""
+
+# KEYS: news:{id}, news:index, news:index:rebuild, надгробие, news:version, news:{id}:version
+# ARGV: member (если хеша уже нет), время жизни надгробия
+DELETE_NEWS_SCRIPT = VERSION_LUA + """
+local member = redis.call('HGET', KEYS[1], '_member') or ARGV[1]
+redis.call('ZREM', KEYS[2], member)
+redis.call('ZREM', KEYS[3], member)
+redis.call('DEL', KEYS[1])
+redis.call('SET', KEYS[4], 1, 'EX', ARGV[2])
+bump_version(KEYS[5])
+bump_version(KEYS[6])
+return 1
+"""
+
+# KEYS: news:index:rebuild, news:index, news:index:ready, news:version
+# ARGV: заглушка, время жизни маркера
+SWAP_INDEX_SCRIPT = VERSION_LUA + """
+redis.call('ZREM', KEYS[1], ARGV[1])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    redis.call('RENAME', KEYS[1], KEYS[2])
+else
+    redis.call('DEL', KEYS[2])
+end
+redis.call('SET', KEYS[3], 1, 'EX', ARGV[2])
+bump_version(KEYS[4])
+return 1
+"""
+
+# KEYS: news:version
+# ARGV: префикс ключа страницы, суффикс ключа страницы
+# Версия и страница читаются за один запрос
+GET_PAGE_SCRIPT = VERSION_LUA + """
+local version = current_version(KEYS[1])
+return {version, redis.call('GET', ARGV[1] .. ':' .. version .. ':' .. ARGV[2])}
+"""
+
+def news_key(news_id: int) -> str:
+    return f"news:{news_id}"
+
+def tombstone_key(news_id: int) -> str:
+    return f"news:tombstone:{news_id}"
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MEMBER_PATTERN = re.compile(r"^\d{17}:\d{10}$")
+
+def index_member(publication_date: datetime, news_id: int) -> str:
+    timestamp = 0
+    if publication_date:
+        if publication_date.tzinfo is None:
+            publication_date = publication_date.replace(tzinfo=timezone.utc)
+        # Считаем в целых микросекундах, чтобы не терять точность на float
+        timestamp = (publication_date - EPOCH) // timedelta(microseconds=1)
+    return f"{timestamp:017d}:{news_id:010d}"
+
+def member_id(member: str) -> int:
+    return int(member.rsplit(":", 1)[1])
+
+def member_key(member: str) -> tuple:
+    """Возвращает (publication_date, id), закодированные в member."""
+    timestamp, news_id = member.split(":")
+    return EPOCH + timedelta(microseconds=int(timestamp)), int(news_id)
+
+def encode_cursor(member: str) -> str:
+    return base64.urlsafe_b64encode(member.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Возвращает member из курсора или None, если курсор некорректный."""
+    try:
+        member = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not MEMBER_PATTERN.match(member):
+        return None
+    return member
+
+def news_body(news) -> str:
+    """Тело ответа API для одной новости - ровно то, что отдал бы response_model."""
+    return news_schemas.News.model_validate(news).model_dump_json()
+
+def _to_hash_args(news) -> list:
+    # В хеше нельзя хранить None, поэтому пустые поля просто не записываем
+    args = []
+    for field in NEWS_FIELDS:
+        value = getattr(news, field)
+        if value is None:
+            continue
+        if isinstance(value, datetime):
+            value = value.isoformat()
+        args.extend((field, value))
+    # Рядом с полями храним готовое тело ответа, чтобы при попадании не сериализовать заново
+    args.extend(("_body", news_body(news)))
+    return args
+
+def as_dict(news) -> dict:
+    """Словарь с полями новости, принимает как объект News, так и словарь."""
+    if isinstance(news, dict):
+        return news
+    return {field: getattr(news, field) for field in NEWS_FIELDS}
+
+def decode_news(data: dict) -> dict:
+    """Словарь новости из хеша Redis."""
+    return {
+        "id": int(data["id"]),
+        "title": data["title"],
+        "content": data["content"],
+        "publication_date": datetime.fromisoformat(data["publication_date"]) if data.get("publication_date") else None,
+        "author_id": int(data["author_id"]) if data.get("author_id") else None,
+        "cover_image": data.get("cover_image"),
+        "comment_count": int(data.get("comment_count") or 0)
+    }
+
+def row_body(row: dict) -> str:
+    # В записях, сделанных до появления _body, тела нет - собираем его из полей
+    return row.get("_body") or news_body(decode_news(row))
+
+async def upsert_news(news):
+    """Атомарно записывает одну новость в хеш и в индекс."""
+    await get_script(UPSERT_NEWS_SCRIPT)(
+        keys=[news_key(news.id), NEWS_INDEX_KEY, NEWS_INDEX_TMP_KEY, NEWS_VERSION_KEY, news_version_key(news.id)],
+        args=[index_member(news.publication_date, news.id), news.row_version, NEWS_TTL, *_to_hash_args(news)]
+    )
+    await invalidate(news_local_cache, news.id)
+
+async def update_news_item(news):
+    """
+    Обновляет закешированную новость без сброса ленты - например, число комментариев.
+    Страницы ленты подхватят новые поля при следующей сборке.
+    """
+    await get_script(UPDATE_NEWS_SCRIPT)(
+        keys=[news_key(news.id), news_version_key(news.id)],
+        args=[news.row_version, *_to_hash_args(news)]
+    )
+    await invalidate(news_local_cache, news.id)
+
+async def fill_news(news_items: list):
+    """Кладёт в кеш прочитанные из БД новости, не затирая более свежие записи."""
+    if not news_items:
+        return
+    redis_client = await get_redis()
+    script = get_script(FILL_NEWS_SCRIPT)
+    pipe = redis_client.pipeline(transaction=False)
+    for news in news_items:
+        await script(
+            keys=[news_key(news.id), NEWS_INDEX_KEY, tombstone_key(news.id)],
+            args=[index_member(news.publication_date, news.id), news.row_version, NEWS_TTL, *_to_hash_args(news)],
+            client=pipe
+        )
+    await pipe.execute()
+
+async def delete_news(news_id: int, publication_date: datetime = None):
+    """Атомарно удаляет новость из хеша и из индекса."""
+    await get_script(DELETE_NEWS_SCRIPT)(
+        keys=[
+            news_key(news_id), NEWS_INDEX_KEY, NEWS_INDEX_TMP_KEY, tombstone_key(news_id),
+            NEWS_VERSION_KEY, news_version_key(news_id)
+        ],
+        args=[index_member(publication_date, news_id), NEWS_TOMBSTONE_TTL]
+    )
+    await invalidate(news_local_cache, news_id)
+
+async def forget_news(news_ids: list):
+    """
+    Удаляет из Redis хеши и версии новостей, которых уже нет в БД, без надгробий.
+    Для массового удаления: индекс после этого нужно перестроить (rebuild_news_index).
+    """
+    redis_client = await get_redis()
+    for start in range(0, len(news_ids), NEWS_REBUILD_BATCH):
+        batch = news_ids[start:start + NEWS_REBUILD_BATCH]
+        await redis_client.delete(
+            *[news_key(news_id) for news_id in batch],
+            *[news_version_key(news_id) for news_id in batch]
+        )
+    news_local_cache.clear()
+
+async def get_news_item(news_id: int):
+    news_items = await get_news_items([news_id])
+    return news_items[0]
+
+async def get_news_items(news_ids: list) -> list:
+    """Возвращает новости в порядке news_ids, None - если новости нет в кеше."""
+    rows = await get_news_rows(news_ids)
+    return [decode_news(row) if row else None for row in rows]
+
+async def get_news_body(news_id: int):
+    rows = await get_news_rows([news_id])
+    return row_body(rows[0]) if rows[0] else None
+
+async def get_news_rows(news_ids: list) -> list:
+    """
+    Возвращает хеши новостей в порядке news_ids, None - если новости нет в кеше.
+    Сначала смотрит в локальный кеш процесса, остальное берёт из Redis за один pipeline.
+    """
+    rows = [news_local_cache.get(str(news_id)) for news_id in news_ids]
+    missing = [i for i, row in enumerate(rows) if row is None]
+    if not missing:
+        return rows
+
+    token = news_local_cache.token()
+    redis_client = await get_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    for i in missing:
+        pipe.hgetall(news_key(news_ids[i]))
+    loaded = await pipe.execute()
+    for i, row in zip(missing, loaded):
+        if row:
+            rows[i] = row
+            news_local_cache.set(str(news_ids[i]), row, token=token)
+    return rows
+
+async def get_index_page(after: str = None, skip: int = 0, limit: int = 100):
+    """
+    Возвращает members страницы из индекса или None, если индекс не построен.
+    Если задан after, страница начинается сразу после этого member (keyset),
+    иначе - с позиции skip.
+    """
+    redis_client = await get_redis()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.exists(NEWS_INDEX_READY_KEY)
+    if after:
+        pipe.zrevrangebylex(NEWS_INDEX_KEY, f"({after}", "-", start=0, num=limit)
+    else:
+        pipe.zrevrange(NEWS_INDEX_KEY, skip, skip + limit - 1)
+    ready, members = await pipe.execute()
+    if not ready:
+        return None
+    return members
+
+def _page_suffix(page_token: str, limit: int) -> str:
+    return f"{page_token}:{limit}"
+
+async def get_list_version() -> str:
+    return await get_version(NEWS_VERSION_KEY)
+
+async def get_cached_page(page_token: str, limit: int):
+    """Возвращает (версия списка, (тело ответа, курсор) или None, мягкий срок страницы)."""
+    version, cached_page = await get_script(GET_PAGE_SCRIPT)(
+        keys=[NEWS_VERSION_KEY],
+        args=[NEWS_PAGE_PREFIX, _page_suffix(page_token, limit)]
+    )
+    payload, soft_expires_at = swr.unpack(cached_page)
+    if payload is None:
+        return version, None, 0
+    # Первая строка - курсор следующей страницы, дальше - готовое тело ответа
+    next_cursor, _, body = payload.partition("\n")
+    return version, (body, next_cursor or None), soft_expires_at
+
+async def set_cached_page(version: str, page_token: str, limit: int, body: str, next_cursor: str = None):
+    # Страница кладётся под версией, прочитанной до запроса в БД:
+    # если за это время была запись, такую страницу уже никто не прочитает
+    cache_key = f"{NEWS_PAGE_PREFIX}:{version}:{_page_suffix(page_token, limit)}"
+    await swr.set_raw(cache_key, f"{next_cursor or ''}\n{body}")
+
+async def rebuild_news_index(db):
+    """
+    Строит индекс из БД во временном ключе и атомарно подменяет им основной.
+    Если индекс уже строит другой воркер, ничего не делает.
+    """
+    lock_token = await acquire_lock(NEWS_INDEX_TMP_KEY, NEWS_REBUILD_LOCK_TTL_MS)
+    if lock_token is None:
+        return
+    try:
+        await _rebuild_news_index(db)
+    finally:
+        await release_lock(NEWS_INDEX_TMP_KEY, lock_token)
+
+async def _rebuild_news_index(db):
+    from sqlalchemy import select
+    from tables.news import News
+
+    redis_client = await get_redis()
+    await redis_client.delete(NEWS_INDEX_TMP_KEY)
+    await redis_client.zadd(NEWS_INDEX_TMP_KEY, {NEWS_INDEX_PLACEHOLDER: 0})
+
+    script = get_script(FILL_NEWS_SCRIPT)
+    result = await db.stream_scalars(
+        select(News).execution_options(yield_per=NEWS_REBUILD_BATCH)
+    )
+    async for batch in result.partitions():
+        pipe = redis_client.pipeline(transaction=False)
+        for news in batch:
+            await script(
+                keys=[news_key(news.id), NEWS_INDEX_TMP_KEY, tombstone_key(news.id)],
+                args=[index_member(news.publication_date, news.id), news.row_version, NEWS_TTL, *_to_hash_args(news)],
+                client=pipe
+            )
+        await pipe.execute()
+
+    await get_script(SWAP_INDEX_SCRIPT)(
+        keys=[NEWS_INDEX_TMP_KEY, NEWS_INDEX_KEY, NEWS_INDEX_READY_KEY, NEWS_VERSION_KEY],
+        args=[NEWS_INDEX_PLACEHOLDER, NEWS_INDEX_READY_TTL]
+    )
@@ -2,6 +2,7 @@ import redis.asyncio as redis
 import os
 
 redis_client = None
+_scripts = {}
 
 async def init_redis():
     global redis_client
@@ -15,4 +16,12 @@ async def get_redis():
 async def close_redis():
     global redis_client
     if redis_client:
-        await redis_client.aclose()
\ No newline at end of file
+        await redis_client.aclose()
+
+def get_script(source: str):
+    """Регистрирует Lua-скрипт один раз, дальше он вызывается через EVALSHA."""
+    script = _scripts.get(source)
+    if script is None or script.registered_client is not redis_client:
+        script = redis_client.register_script(source)
+        _scripts[source] = script
+    return script
\ No newline at end of file
@@ -0,0 +1,47 @@
+import base64
+import hashlib
+import math
+from redis_cache.redis_client import get_redis
+from config import settings
+
+# Результаты поиска кешируются ненадолго под версией списка новостей:
+# после любой записи в новости старые выдачи просто перестают читаться.
+# Ключ - news:search:{версия}:{хеш нормализованного запроса}:{курсор}:{limit}
+SEARCH_PREFIX = "news:search"
+
+def normalize_query(query: str) -> str:
+    # Регистр и лишние пробелы на результат не влияют - такие запросы делят одну запись
+    return " ".join(query.lower().split())
+
+def search_key(version: str, query: str, cursor: str, limit: int) -> str:
+    query_hash = hashlib.sha1(query.encode()).hexdigest()
+    return f"{SEARCH_PREFIX}:{version}:{query_hash}:{cursor or ''}:{limit}"
+
+def encode_search_cursor(rank: float, news_id: int) -> str:
+    # repr восстанавливает float без потерь, поэтому keyset по рангу не пропускает строк
+    return base64.urlsafe_b64encode(f"{rank!r}:{news_id}".encode()).decode().rstrip("=")
+
+def decode_search_cursor(cursor: str):
+    """Возвращает (ранг, id) из курсора или None, если курсор некорректный."""
+    try:
+        value = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        rank, news_id = value.split(":")
+        rank, news_id = float(rank), int(news_id)
+    except ValueError:
+        return None
+    if not math.isfinite(rank):
+        return None
+    return rank, news_id
+
+async def get_cached_search(key: str):
+    """Возвращает (тело ответа, курсор) или None."""
+    redis_client = await get_redis()
+    payload = await redis_client.get(key)
+    if payload is None:
+        return None
+    next_cursor, _, body = payload.partition("\n")
+    return body, next_cursor or None
+
+async def set_cached_search(key: str, body: str, next_cursor: str = None):
+    redis_client = await get_redis()
+    await redis_client.set(key, f"{next_cursor or ''}\n{body}", ex=settings.SEARCH_CACHE_TTL)
@@ -0,0 +1,169 @@
+from datetime import datetime
+from typing import Optional
+from redis_cache.redis_client import get_redis, get_script
+import serialization
+
+# Все refresh-сессии пользователя лежат в одном хеше sessions:{user_id}:
+# поле - refresh token, значение - сессия в JSON. user_id есть в самом refresh token,
+# поэтому по токену сразу понятно, в каком хеше искать сессию.
+# Redis - горячий слой, каждое изменение ещё и ставится в список WRITE_BEHIND_KEY,
+# откуда его пачками переносят в таблицу refresh_sessions (см. auth/sessions.py)
+
+SESSIONS_PREFIX = "sessions"
+WRITE_BEHIND_KEY = "sessions:write_behind"
+
+# Отдаёт живые сессии и тут же удаляет истёкшие - один запрос к Redis.
+# Отозванные сессии остаются в хеше, пока их удаление не дошло до БД
+# (чтобы их не подняли оттуда обратно), но не отдаются.
+# Если хеша нет совсем, возвращает nil - сессии нужно искать в БД.
+# Даты в JSON записаны кодеком в ISO 8601 и сравниваются как строки
+LIST_SESSIONS_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 0 then
+    return false
+end
+local entries = redis.call('HGETALL', KEYS[1])
+local live = {}
+local expired = {}
+for i = 1, #entries, 2 do
+    local session = cjson.decode(entries[i + 1])
+    if session['expires_at'] <= ARGV[1] then
+        table.insert(expired, entries[i])
+    elseif not session['revoked'] then
+        table.insert(live, entries[i + 1])
+    end
+end
+if #expired > 0 then
+    redis.call('HDEL', KEYS[1], unpack(expired))
+end
+return live
+"""
+
+# Ротация refresh token: старая сессия должна существовать, не быть отозванной и не истечь.
+# Она отзывается, новая добавляется, изменение ставится в очередь записи в БД - атомарно.
+# 1 - ротация прошла, 0 - сессии нет в Redis, -1 - сессия отозвана или истекла
+ROTATE_SESSION_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current then
+    return 0
+end
+local session = cjson.decode(current)
+if session['revoked'] or session['expires_at'] <= ARGV[5] then
+    return -1
+end
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode({revoked = true, expires_at = session['expires_at']}))
+redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('RPUSH', KEYS[2], ARGV[6])
+return 1
+"""
+
+# Отзыв сессии (logout). Коды ответа те же, что у ротации
+REVOKE_SESSION_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if not current then
+    return 0
+end
+local session = cjson.decode(current)
+if session['revoked'] or session['expires_at'] <= ARGV[2] then
+    return -1
+end
+redis.call('HSET', KEYS[1], ARGV[1], cjson.encode({revoked = true, expires_at = session['expires_at']}))
+redis.call('RPUSH', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Подтверждение пачки из очереди записи в БД. Пачка удаляется, только если блокировка
+# всё ещё у того, кто её записал: иначе её уже перечитал другой воркер, и два LTRIM
+# выбросили бы ещё не записанные изменения. Вместе с пачкой удаляются отметки об отзыве -
+# сессий больше нет и в БД, поднимать из БД нечего.
+# KEYS: блокировка, очередь, затем хеши сессий; ARGV: токен блокировки, размер пачки,
+# затем refresh token для каждого хеша
+ACK_WRITES_SCRIPT = """
+if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+    return 0
+end
+redis.call('LTRIM', KEYS[2], ARGV[2], -1)
+for i = 3, #KEYS do
+    local current = redis.call('HGET', KEYS[i], ARGV[i])
+    if current and cjson.decode(current)['revoked'] then
+        redis.call('HDEL', KEYS[i], ARGV[i])
+    end
+end
+return 1
+"""
+
+OK = 1
+MISSING = 0
+REVOKED = -1
+
+def sessions_key(user_id: int) -> str:
+    return f"{SESSIONS_PREFIX}:{user_id}"
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+def _write_event(add: list = (), delete: list = ()) -> str:
+    """add - новые сессии, delete - пары (user_id, refresh token) отозванных."""
+    return serialization.dumps({"add": list(add), "delete": [list(item) for item in delete]})
+
+async def add_session(user_id: int, refresh_token: str, session: dict, ttl: int):
+    """Добавляет сессию и продлевает хеш пользователя на ttl секунд."""
+    redis_client = await get_redis()
+    key = sessions_key(user_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(key, refresh_token, serialization.dumps(session))
+        pipe.expire(key, ttl)
+        pipe.rpush(WRITE_BEHIND_KEY, _write_event(add=[session]))
+        await pipe.execute()
+
+async def rehydrate_sessions(user_id: int, sessions: list, ttl: int):
+    """
+    Возвращает в Redis сессии, найденные в БД. HSETNX не перезапишет сессию,
+    которую уже отозвали в Redis, пока она ещё не удалена из БД.
+    """
+    redis_client = await get_redis()
+    key = sessions_key(user_id)
+    async with redis_client.pipeline(transaction=True) as pipe:
+        for session in sessions:
+            pipe.hsetnx(key, session["refresh_token"], serialization.dumps(session))
+        pipe.expire(key, ttl)
+        await pipe.execute()
+
+async def revoke_session(user_id: int, refresh_token: str) -> int:
+    return await get_script(REVOKE_SESSION_SCRIPT)(
+        keys=[sessions_key(user_id), WRITE_BEHIND_KEY],
+        args=[refresh_token, _now(), _write_event(delete=[(user_id, refresh_token)])]
+    )
+
+async def list_sessions(user_id: int) -> Optional[list]:
+    """Живые сессии пользователя или None, если в Redis о нём ничего нет."""
+    sessions = await get_script(LIST_SESSIONS_SCRIPT)(keys=[sessions_key(user_id)], args=[_now()])
+    if sessions is None:
+        return None
+    return [serialization.loads(session) for session in sessions]
+
+async def rotate_session(user_id: int, old_token: str, new_token: str, session: dict, ttl: int) -> int:
+    """Заменяет сессию old_token на новую. Возвращает OK, MISSING или REVOKED."""
+    return await get_script(ROTATE_SESSION_SCRIPT)(
+        keys=[sessions_key(user_id), WRITE_BEHIND_KEY],
+        args=[
+            old_token, new_token, serialization.dumps(session), ttl, _now(),
+            _write_event(add=[session], delete=[(user_id, old_token)])
+        ]
+    )
+
+async def pending_writes(limit: int) -> list:
+    """Первые limit изменений из очереди записи в БД, из очереди они не удаляются."""
+    redis_client = await get_redis()
+    events = await redis_client.lrange(WRITE_BEHIND_KEY, 0, limit - 1)
+    return [serialization.loads(event) for event in events]
+
+async def ack_writes(lock: str, lock_token: str, count: int, revoked: list) -> bool:
+    """
+    Удаляет из очереди count изменений, уже записанных в БД, и отметки revoked -
+    пары (user_id, refresh token). False - блокировка истекла, пачку не трогаем.
+    """
+    return bool(await get_script(ACK_WRITES_SCRIPT)(
+        keys=[lock, WRITE_BEHIND_KEY] + [sessions_key(user_id) for user_id, _ in revoked],
+        args=[lock_token, count] + [refresh_token for _, refresh_token in revoked]
+    ))
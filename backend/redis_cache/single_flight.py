@@ -0,0 +1,87 @@
+import asyncio
+import uuid
+from redis_cache.redis_client import get_redis, get_script
+
+# Сколько живёт блокировка, если захвативший её воркер упал
+LOCK_TTL_MS = 5000
+# Сколько остальные воркеры ждут, пока запись восстановит владелец блокировки
+LOCK_WAIT = 1.0
+LOCK_POLL_INTERVAL = 0.05
+
+# Снимаем блокировку, только если она всё ещё наша
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# Лидер запроса был отменён - остальным нужно загрузить значение самим
+_RETRY = object()
+
+_in_flight = {}
+
+def lock_key(key: str) -> str:
+    return f"lock:{key}"
+
+async def acquire_lock(key: str, ttl_ms: int = LOCK_TTL_MS):
+    """Возвращает токен блокировки или None, если её держит другой воркер."""
+    redis_client = await get_redis()
+    token = uuid.uuid4().hex
+    if await redis_client.set(lock_key(key), token, nx=True, px=ttl_ms):
+        return token
+    return None
+
+async def release_lock(key: str, token: str):
+    await get_script(RELEASE_LOCK_SCRIPT)(keys=[lock_key(key)], args=[token])
+
+async def _load_with_lock(key: str, loader, load_cached):
+    token = await acquire_lock(key)
+    if token is None:
+        # Запись уже восстанавливает другой воркер - немного ждём его результат
+        waited = 0
+        while waited < LOCK_WAIT:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            waited += LOCK_POLL_INTERVAL
+            cached = await load_cached()
+            if cached is not None:
+                return cached
+        # Не дождались - идём в БД сами, чтобы не держать запрос
+        return await loader()
+    try:
+        return await loader()
+    finally:
+        await release_lock(key, token)
+
+async def single_flight(key: str, loader, load_cached):
+    """
+    Защита от лавины промахов кеша.
+    В процессе одновременные промахи по одному ключу ждут одну корутину loader,
+    между воркерами - короткую блокировку в Redis: её владелец загружает значение,
+    остальные ждут, пока оно появится в кеше (load_cached вернёт не None).
+    """
+    while True:
+        future = _in_flight.get(key)
+        if future is None:
+            break
+        result = await asyncio.shield(future)
+        if result is not _RETRY:
+            return result
+
+    future = asyncio.get_running_loop().create_future()
+    _in_flight[key] = future
+    try:
+        result = await _load_with_lock(key, loader, load_cached)
+    except asyncio.CancelledError:
+        future.set_result(_RETRY)
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Исключение уже получит вызывающий, ожидающих может не быть
+        future.exception()
+        raise
+    else:
+        future.set_result(result)
+        return result
+    finally:
+        _in_flight.pop(key, None)
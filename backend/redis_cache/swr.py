@@ -0,0 +1,74 @@
+import asyncio
+import time
+from redis_cache.redis_client import get_redis
+from redis_cache.single_flight import acquire_lock, release_lock
+from config import settings
+import serialization
+from monitoring.monitoring import logger
+
+# Записи кеша хранятся вместе с мягким сроком жизни: "{unix-время}:{данные}".
+# До мягкого срока запись свежая, после него - отдаётся как есть и обновляется
+# в фоне, а жёсткий срок (TTL ключа в Redis) ограничивает, сколько можно отдавать устаревшее.
+# Данные - строка, поэтому готовое тело ответа можно хранить без обёртки в JSON.
+
+def pack(payload: str, soft_ttl: int = None) -> str:
+    soft_ttl = settings.CACHE_SOFT_TTL if soft_ttl is None else soft_ttl
+    return f"{time.time() + soft_ttl:.3f}:{payload}"
+
+def unpack(raw):
+    """Возвращает (данные, мягкий срок) или (None, 0), если записи нет."""
+    if raw is None:
+        return None, 0
+    soft_expires_at, _, payload = raw.partition(":")
+    return payload, float(soft_expires_at)
+
+def is_stale(soft_expires_at: float) -> bool:
+    return soft_expires_at < time.time()
+
+async def get_raw(key: str):
+    redis_client = await get_redis()
+    return unpack(await redis_client.get(key))
+
+async def set_raw(key: str, payload: str, soft_ttl: int = None, hard_ttl: int = None):
+    redis_client = await get_redis()
+    hard_ttl = settings.CACHE_HARD_TTL if hard_ttl is None else hard_ttl
+    await redis_client.set(key, pack(payload, soft_ttl), ex=hard_ttl)
+
+async def get_entry(key: str):
+    payload, soft_expires_at = await get_raw(key)
+    if payload is None:
+        return None, 0
+    return serialization.loads(payload), soft_expires_at
+
+async def set_entry(key: str, value, soft_ttl: int = None, hard_ttl: int = None):
+    await set_raw(key, serialization.dumps(value), soft_ttl, hard_ttl)
+
+async def refresh(key: str, refresher):
+    """Обновляет запись, если её прямо сейчас не обновляет другой воркер."""
+    token = await acquire_lock(f"refresh:{key}")
+    if token is None:
+        return
+    try:
+        await refresher()
+    finally:
+        await release_lock(f"refresh:{key}", token)
+
+_refreshing = {}
+
+def refresh_in_background(key: str, refresher):
+    """Запускает обновление записи в фоне, не больше одного на ключ в процессе."""
+    if key in _refreshing:
+        return
+    _refreshing[key] = asyncio.create_task(_refresh_in_background(key, refresher))
+
+async def _refresh_in_background(key: str, refresher):
+    try:
+        await refresh(key, refresher)
+    except Exception as e:
+        logger.error(
+            "failed_refreshing_cache",
+            key=key,
+            error=str(e)
+        )
+    finally:
+        _refreshing.pop(key, None)
@@ -0,0 +1,65 @@
+from typing import Optional
+from redis_cache.redis_client import get_redis, get_script
+
+# Версии ресурсов для ETag. Версия заводится от текущего времени Redis в микросекундах,
+# а не с нуля: если ключ истёк или Redis очистили, новая версия всё равно будет больше
+# любой выданной раньше, и старый ETag случайно не совпадёт с новым содержимым.
+VERSION_TTL = 86400
+
+# Lua-функции, которые подключаются в начало скриптов, меняющих версии
+VERSION_LUA = """
+local function current_version(key)
+    local version = redis.call('GET', key)
+    if not version then
+        local now = redis.call('TIME')
+        version = now[1] .. string.format('%06d', tonumber(now[2]))
+        redis.call('SET', key, version, 'EX', {ttl})
+    end
+    return version
+end
+local function bump_version(key)
+    current_version(key)
+    local version = redis.call('INCR', key)
+    redis.call('EXPIRE', key, {ttl})
+    return version
+end
+""".replace("{ttl}", str(VERSION_TTL))
+
+# KEYS: ключи версий
+GET_VERSIONS_SCRIPT = VERSION_LUA + """
+local versions = {}
+for i, key in ipairs(KEYS) do
+    versions[i] = current_version(key)
+end
+return versions
+"""
+
+# KEYS: ключи версий
+BUMP_VERSIONS_SCRIPT = VERSION_LUA + """
+for _, key in ipairs(KEYS) do
+    bump_version(key)
+end
+return 1
+"""
+
+def news_version_key(news_id: int) -> str:
+    return f"news:{news_id}:version"
+
+def comments_version_key(news_id: int) -> str:
+    return f"comments:{news_id}:version"
+
+async def get_versions(*keys) -> list:
+    versions = await get_script(GET_VERSIONS_SCRIPT)(keys=list(keys))
+    return [str(version) for version in versions]
+
+async def get_version(key: str) -> str:
+    versions = await get_versions(key)
+    return versions[0]
+
+async def peek_version(key: str) -> Optional[str]:
+    """Версия без заведения ключа: None, если версии ещё нет."""
+    redis_client = await get_redis()
+    return await redis_client.get(key)
+
+async def bump_versions(*keys):
+    await get_script(BUMP_VERSIONS_SCRIPT)(keys=list(keys))
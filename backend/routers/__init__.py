@@ -2,5 +2,6 @@ from .users import router as users_router
 from .news import router as news_router
 from .comments import router as comments_router
 from .metrics import router as metrics_router
+from .digests import router as digests_router
 
-__all__ = ["users_router", "news_router", "comments_router", "metrics_router"]
\ No newline at end of file
+__all__ = ["users_router", "news_router", "comments_router", "metrics_router", "digests_router"]
\ No newline at end of file
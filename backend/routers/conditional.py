@@ -0,0 +1,20 @@
+from fastapi import Request, Response
+from config import settings
+
+# Условные GET-запросы: клиент присылает If-None-Match с ETag из прошлого ответа,
+# и если версия ресурса не изменилась, получает 304 без тела.
+
+def make_etag(*parts) -> str:
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+def cache_headers(route: str, etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": settings.CACHE_CONTROL[route]}
+
+def not_modified(route: str, etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(route, etag))
@@ -0,0 +1,31 @@
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Path, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from database import get_db
+from services.digests import DigestService
+import schemas.digests as digest_schemas
+from monitoring.monitoring import logger
+
+router = APIRouter(prefix="/digests", tags=["digests"])
+
+@router.get("/{year}-W{week}", response_model=digest_schemas.Digest)
+async def read_digest(
+    year: int = Path(..., ge=1970, le=9999),
+    week: int = Path(..., ge=1, le=53),
+    db: AsyncSession = Depends(get_db)
+    ):
+    'Архивный дайджест за ISO-неделю, например /digests/2025-W07.'
+    logger.info(
+            "getting_digest",
+            year=year,
+            week=week
+    )
+    try:
+        # В некоторых годах нет 53-й недели
+        date.fromisocalendar(year, week, 1)
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Week does not exist")
+    body = await DigestService.get_digest_body(db=db, year=year, week=week)
+    if not body:
+        raise HTTPException(status_code=404, detail="Digest not found")
+    return Response(content=body, media_type="application/json")
@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from database import get_db
 from services.news import NewsService
@@ -7,9 +8,14 @@ from services.comments import CommentService
 import schemas.comments as comment_schemas
 from auth.dependencies import get_current_verified_author, get_current_user, verify_news_access
 from monitoring.monitoring import track_news_creation, logger
+from config import settings
+from routers.conditional import make_etag, etag_matches, cache_headers, not_modified
 
 router = APIRouter(prefix="/news", tags=["news"])
 
+# Сколько новостей можно запросить в /news/batch за раз
+NEWS_BATCH_LIMIT = 100
+
 @router.post("/", response_model=news_schemas.News)
 @track_news_creation
 async def create_news(
@@ -26,38 +32,124 @@ async def create_news(
 @router.get("/{news_id}/comments/", response_model=list[comment_schemas.Comment])
 async def read_comments_by_news(
     news_id: int, 
+    request: Request,
+    cursor: Optional[str] = None,
+    limit: int = Query(settings.COMMENTS_PAGE_SIZE, ge=1, le=100),
     db: AsyncSession = Depends(get_db)
     ):
+    'Комментарии от старых к новым. Курсор следующей страницы возвращается в заголовке X-Next-Cursor.'
     logger.info(
             "getting_comments",
-            news_id=news_id
+            news_id=news_id,
+            cursor=cursor
     )
-    return await CommentService.get_comments_by_news(db=db, news_id=news_id)
+    # Версию читаем до запроса в БД: если комментарии не менялись, в БД не идём
+    version = await CommentService.peek_comments_version(news_id)
+    if version is None:
+        # Версию заводим только для существующей новости
+        if not await NewsService.get_news_body_by_id(db=db, news_id=news_id):
+            raise HTTPException(status_code=404, detail="News not found")
+        version = await CommentService.get_comments_version(news_id)
+    etag = make_etag("comments", news_id, version)
+    if etag_matches(request, etag):
+        return not_modified("news_comments", etag)
+    body, next_cursor = await CommentService.get_comments_page_body(
+        db=db, news_id=news_id, version=version, cursor=cursor, limit=limit
+    )
+    headers = cache_headers("news_comments", etag)
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/", response_model=list[news_schemas.News])
 async def read_news(
-    skip: int = 0, 
-    limit: int = 100, 
+    request: Request,
+    cursor: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+    ):
+    'Лента новостей. Курсор следующей страницы возвращается в заголовке X-Next-Cursor.'
+    logger.info(
+            "getting_news",
+            cursor=cursor
+    )
+    if request.headers.get("if-none-match"):
+        # Для 304 достаточно версии списка, саму страницу не читаем
+        etag = make_etag("news", await NewsService.get_list_version())
+        if etag_matches(request, etag):
+            return not_modified("news_list", etag)
+
+    # Тело ответа уже сериализовано и лежит в кеше - отдаём его без response_model
+    body, next_cursor, version = await NewsService.get_news_page_body(db=db, cursor=cursor, skip=skip, limit=limit)
+    headers = cache_headers("news_list", make_etag("news", version))
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@router.get("/batch", response_model=list[news_schemas.News])
+async def read_news_batch(
+    ids: str = Query(..., description="id новостей через запятую"),
+    db: AsyncSession = Depends(get_db)
+    ):
+    'Несколько новостей за один запрос, в порядке ids. Несуществующие новости пропускаются.'
+    try:
+        news_ids = [int(news_id) for news_id in ids.split(",") if news_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma-separated list of integers")
+    if not news_ids or len(news_ids) > NEWS_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"ids must contain from 1 to {NEWS_BATCH_LIMIT} values")
+    logger.info(
+            "getting_news_batch",
+            count=len(news_ids)
+    )
+    body = await NewsService.get_news_batch_body(db=db, news_ids=news_ids)
+    return Response(content=body, media_type="application/json")
+
+@router.get("/search", response_model=list[news_schemas.News])
+async def search_news(
+    q: str = Query(..., min_length=1, max_length=200),
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
     db: AsyncSession = Depends(get_db)
     ):
+    'Поиск по заголовку и тексту новостей. Курсор следующей страницы - в заголовке X-Next-Cursor.'
     logger.info(
-            "getting_news"
+            "searching_news",
+            query=q
     )
-    return await NewsService.get_news(db=db, skip=skip, limit=limit)
+    body, next_cursor = await NewsService.search_news_body(db=db, query=q, cursor=cursor, limit=limit)
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @router.get("/{news_id}", response_model=news_schemas.News)
 async def read_news_by_id(
     news_id: int, 
+    request: Request,
     db: AsyncSession = Depends(get_db)
     ):
     logger.info(
             "getting_news_by_news_id",
             news_id=news_id
     )
-    news = await NewsService.get_news_by_id(db=db, news_id=news_id)
-    if not news:
+    # Версию заводим только для найденной новости, чтобы запросы к несуществующим id
+    # не оставляли в Redis ключей версий
+    version = await NewsService.peek_news_version(news_id)
+    if version is not None:
+        etag = make_etag("news", news_id, version)
+        if etag_matches(request, etag):
+            return not_modified("news_item", etag)
+    body = await NewsService.get_news_body_by_id(db=db, news_id=news_id)
+    if not body:
         raise HTTPException(status_code=404, detail="News not found")
-    return news
+    if version is None:
+        version = await NewsService.get_news_version(news_id)
+        # Версия заведена после чтения: перечитываем тело, чтобы оно было не старше версии
+        body = await NewsService.get_news_body_by_id(db=db, news_id=news_id)
+        if not body:
+            raise HTTPException(status_code=404, detail="News not found")
+    etag = make_etag("news", news_id, version)
+    return Response(content=body, media_type="application/json", headers=cache_headers("news_item", etag))
 
 @router.put("/{news_id}", response_model=news_schemas.News)
 async def update_news(
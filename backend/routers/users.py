@@ -21,7 +21,7 @@ async def read_users(
     ):
     logger.info(
             "getting_users",
-             user_id=current_user.user_id
+             user_id=current_user.id
     )
     users = await UserService.get_users(db=db, skip=skip, limit=limit)
     return users
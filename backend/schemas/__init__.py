@@ -1,5 +1,6 @@
 from .users import User, UserCreate
 from .news import News, NewsCreate  
 from .comments import Comment, CommentCreate
+from .digests import Digest, DigestItem
 
-__all__ = ["User", "UserCreate", "News", "NewsCreate", "Comment", "CommentCreate"]
\ No newline at end of file
+__all__ = ["User", "UserCreate", "News", "NewsCreate", "Comment", "CommentCreate", "Digest", "DigestItem"]
\ No newline at end of file
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+from datetime import datetime
+
+class DigestItem(BaseModel):
+    id: int
+    title: str
+    author_id: int
+    publication_date: datetime
+
+class Digest(BaseModel):
+    year: int
+    week: int
+    period_start: datetime
+    period_end: datetime
+    news_count: int
+    items: list[DigestItem]
+    
+    class Config:
+        from_attributes = True
@@ -14,6 +14,7 @@ class News(NewsBase):
     id: int
     publication_date: datetime
     author_id: int
+    comment_count: int = 0
     
     class Config:
         from_attributes = True
\ No newline at end of file
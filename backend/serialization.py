@@ -0,0 +1,116 @@
+# serialization.py
+import json
+from abc import ABC, abstractmethod
+from datetime import date, datetime
+from uuid import UUID
+from fastapi.responses import JSONResponse
+from config import settings
+from monitoring.monitoring import logger
+
+# Единая точка сериализации JSON для кеша и ответов API.
+# Реализация выбирается переменной JSON_CODEC: orjson, msgspec или json.
+# Даты кодируются самим кодеком в ISO 8601, собирать словари с .isoformat() не нужно.
+
+class JsonCodec(ABC):
+    """Интерфейс кодека."""
+    name = None
+
+    @abstractmethod
+    def dumps(self, obj) -> str:
+        ...
+
+    @abstractmethod
+    def dumps_bytes(self, obj) -> bytes:
+        ...
+
+    @abstractmethod
+    def loads(self, data):
+        ...
+
+def _default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, UUID):
+        return str(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+class StdlibCodec(JsonCodec):
+    name = "json"
+
+    def dumps(self, obj) -> str:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps_bytes(self, obj) -> bytes:
+        return self.dumps(obj).encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+class OrjsonCodec(JsonCodec):
+    name = "orjson"
+
+    def __init__(self):
+        import orjson
+        self._orjson = orjson
+
+    def dumps(self, obj) -> str:
+        return self._orjson.dumps(obj, default=_default).decode()
+
+    def dumps_bytes(self, obj) -> bytes:
+        return self._orjson.dumps(obj, default=_default)
+
+    def loads(self, data):
+        return self._orjson.loads(data)
+
+class MsgspecCodec(JsonCodec):
+    name = "msgspec"
+
+    def __init__(self):
+        import msgspec
+        self._encoder = msgspec.json.Encoder(enc_hook=_default)
+        self._decoder = msgspec.json.Decoder()
+
+    def dumps(self, obj) -> str:
+        return self._encoder.encode(obj).decode()
+
+    def dumps_bytes(self, obj) -> bytes:
+        return self._encoder.encode(obj)
+
+    def loads(self, data):
+        return self._decoder.decode(data)
+
+CODECS = {
+    "json": StdlibCodec,
+    "orjson": OrjsonCodec,
+    "msgspec": MsgspecCodec,
+}
+
+def create_codec(name: str) -> JsonCodec:
+    try:
+        return CODECS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown JSON codec: {name}. Available: {', '.join(CODECS)}")
+    except ImportError:
+        logger.warning(
+            "json_codec_not_installed",
+            codec=name,
+            fallback=StdlibCodec.name
+        )
+        return StdlibCodec()
+
+codec = create_codec(settings.JSON_CODEC)
+
+def dumps(obj) -> str:
+    return codec.dumps(obj)
+
+def dumps_bytes(obj) -> bytes:
+    return codec.dumps_bytes(obj)
+
+def loads(data):
+    return codec.loads(data)
+
+class CodecJSONResponse(JSONResponse):
+    """Ответ FastAPI по умолчанию, кодируется выбранным кодеком."""
+
+    def render(self, content) -> bytes:
+        return codec.dumps_bytes(content)
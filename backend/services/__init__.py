@@ -1,5 +1,7 @@
 from .users import UserService
 from .news import NewsService
 from .comments import CommentService
+from .digests import DigestService
+from .outbox import OutboxService
 
-__all__ = ["UserService", "NewsService", "CommentService"]
\ No newline at end of file
+__all__ = ["UserService", "NewsService", "CommentService", "DigestService", "OutboxService"]
\ No newline at end of file
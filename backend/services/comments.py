@@ -2,9 +2,12 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 from tables.news import News
 from tables.comments import Comment
-from sqlalchemy import select
+from sqlalchemy import select, update, tuple_
 import schemas.comments as comment_schemas
 from monitoring.monitoring import logger
+from redis_cache import versions
+from redis_cache import comments_cache, news_cache
+from redis_cache.single_flight import single_flight
 
 class CommentService:
 
@@ -24,18 +27,94 @@ class CommentService:
         
         db_comment = Comment(**comment.model_dump(), news_id=news_id, author_id=author_id)
         db.add(db_comment)
+        await CommentService._change_comment_count(db, news_id, 1)
         await db.commit()
         await db.refresh(db_comment)
+        await versions.bump_versions(versions.comments_version_key(news_id))
+        await CommentService._update_cached_news(db, news_id)
         return db_comment
 
     async def get_comments(db: AsyncSession, skip: int = 0, limit: int = 100):
         result = await db.execute(select(Comment).offset(skip).limit(limit))
         return result.scalars().all()
 
-    async def get_comments_by_news(db: AsyncSession, news_id: int):
-        result = await db.execute(select(Comment).where(Comment.news_id == news_id))
+    async def get_comments_version(news_id: int):
+        return await versions.get_version(versions.comments_version_key(news_id))
+
+    async def peek_comments_version(news_id: int):
+        return await versions.peek_version(versions.comments_version_key(news_id))
+
+    async def get_comments_by_news(db: AsyncSession, news_id: int, after: str = None, limit: int = 50):
+        """Комментарии к новости от старых к новым, after - member курсора предыдущей страницы."""
+        query = (
+            select(Comment)
+            .where(Comment.news_id == news_id)
+            .order_by(Comment.publication_date, Comment.id)
+            .limit(limit)
+        )
+        if after:
+            # Keyset по индексу (news_id, publication_date, id)
+            query = query.where(tuple_(Comment.publication_date, Comment.id) > news_cache.member_key(after))
+        result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_comments_page_body(db: AsyncSession, news_id: int, version: str, cursor: str = None, limit: int = 50):
+        """
+        Страница комментариев готовым JSON-телом: (тело, курсор следующей страницы или None).
+        Первая страница кешируется под версией комментариев, прочитанной до запроса в БД.
+        """
+        if cursor:
+            after = news_cache.decode_cursor(cursor)
+            if after is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            return await CommentService._load_page(db, news_id, after, limit)
+
+        cached_page = await comments_cache.get_first_page(news_id, version, limit)
+        if cached_page:
+            print("Комментарии есть в кеше! Возвращаем...")
+            return cached_page
+
+        async def load_first_page():
+            body, next_cursor = await CommentService._load_page(db, news_id, None, limit)
+            await comments_cache.set_first_page(news_id, version, limit, body, next_cursor)
+            return body, next_cursor
+
+        # Одновременные промахи по комментариям популярной новости идут в БД один раз
+        return await single_flight(
+            comments_cache.first_page_key(news_id, version, limit),
+            load_first_page,
+            lambda: comments_cache.get_first_page(news_id, version, limit)
+        )
+
+    async def _load_page(db: AsyncSession, news_id: int, after: str, limit: int):
+        comments = await CommentService.get_comments_by_news(db=db, news_id=news_id, after=after, limit=limit)
+        body = "[" + ",".join(
+            comment_schemas.Comment.model_validate(comment).model_dump_json() for comment in comments
+        ) + "]"
+        next_cursor = None
+        if len(comments) == limit:
+            last = comments[-1]
+            next_cursor = news_cache.encode_cursor(news_cache.index_member(last.publication_date, last.id))
+        return body, next_cursor
+
+    async def _change_comment_count(db: AsyncSession, news_id: int, delta: int):
+        # Счётчик меняется в той же транзакции, что и сами комментарии
+        await db.execute(
+            update(News)
+            .where(News.id == news_id)
+            .values(comment_count=News.comment_count + delta, row_version=News.row_version + 1)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _update_cached_news(db: AsyncSession, news_id: int):
+        # Новое число комментариев попадает в кеш новости, лента при этом не сбрасывается
+        result = await db.execute(
+            select(News).where(News.id == news_id).execution_options(populate_existing=True)
+        )
+        news = result.scalar_one_or_none()
+        if news:
+            await news_cache.update_news_item(news)
+
     async def update_comment(db: AsyncSession, comment_id: int, comment_update: comment_schemas.CommentCreate):
         result = await db.execute(select(Comment).where(Comment.id == comment_id))
         db_comment = result.scalar_one_or_none()
@@ -44,12 +123,16 @@ class CommentService:
                 setattr(db_comment, field, value)
             await db.commit()
             await db.refresh(db_comment)
+            await versions.bump_versions(versions.comments_version_key(db_comment.news_id))
         return db_comment
 
     async def delete_comment(db: AsyncSession, comment_id: int):
         result = await db.execute(select(Comment).where(Comment.id == comment_id))
         db_comment = result.scalar_one_or_none()
         if db_comment:
-            db.delete(db_comment)
+            await db.delete(db_comment)
+            await CommentService._change_comment_count(db, db_comment.news_id, -1)
             await db.commit()
+            await versions.bump_versions(versions.comments_version_key(db_comment.news_id))
+            await CommentService._update_cached_news(db, db_comment.news_id)
         return db_comment
\ No newline at end of file
@@ -0,0 +1,25 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+from tables.digests import Digest
+import schemas.digests as digest_schemas
+from redis_cache import digest_cache
+
+class DigestService:
+
+    def render(digest) -> str:
+        return digest_schemas.Digest.model_validate(digest).model_dump_json()
+
+    async def get_digest_body(db: AsyncSession, year: int, week: int):
+        """Готовое JSON-тело дайджеста или None, если неделя ещё не заархивирована."""
+        body = await digest_cache.get_digest_body(year, week)
+        if body:
+            print("Дайджест есть в кеше! Возвращаем...")
+            return body
+        print("Дайджеста нет в кеше( сейчас засунем...")
+        result = await db.execute(select(Digest).where(Digest.year == year, Digest.week == week))
+        digest = result.scalar_one_or_none()
+        if not digest:
+            return None
+        body = DigestService.render(digest)
+        await digest_cache.set_digest_body(year, week, body)
+        return body
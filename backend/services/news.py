@@ -1,154 +1,299 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from tables.news import News
+from tables.news import News, SEARCH_CONFIG
 from tables.comments import Comment
 from fastapi import HTTPException
 import schemas.news as news_schemas
-from sqlalchemy import select, delete
-from redis_cache.redis_client import get_redis
-import json
-from datetime import datetime
-from services.users import UserService
-from celery_.tasks import send_email_task
+from sqlalchemy import select, delete, tuple_, func, cast, any_, Integer
+from sqlalchemy.dialects.postgresql import REGCONFIG, ARRAY
+from redis_cache import news_cache
+from redis_cache import search_cache
+from redis_cache.single_flight import single_flight
+from redis_cache import swr
+from redis_cache import versions
+import asyncio
+import time
+from config import settings
+from database import async_session_maker
+from services.outbox import OutboxService
 from monitoring.monitoring import logger
 
 class NewsService:
 
     async def create_news(db: AsyncSession, news: news_schemas.NewsCreate, author_id: int):
-        redis_client = await get_redis()
-        cache_key = f"news_id:all"
-
         db_news = News(**news.model_dump(), author_id=author_id)
-        try:
-            users = await UserService.get_users(db=db)
-            # Преобразуем SQLAlchemy объекты в словари
-            users_data = []
-            for user in users:
-                users_data.append({
-                    "id": user.id,
-                    "name": user.name,
-                    "email": user.email
-                })
-
-            # Преобразуем новость в словарь
-
-            news_data = {
-                "id": db_news.id,
-                "title": db_news.title,
-                "content": db_news.content,
-                "publication_date": datetime.now(),
-                "author_id": db_news.author_id,
-                "cover_image": db_news.cover_image
-            }
-            task = send_email_task.delay(users_data, news_data)
-        except Exception as e:
-            logger.error(
-                "failed_creating_news",
-                news_id=news.news_id,
-                author_id=author_id
-            )
-            from main import get_hawk
-            hawk = get_hawk()
-            hawk.send(ValueError("Couldn't create news"), {"status_code": "500"})
-            raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
         db.add(db_news)
+        # flush выдаёт id новости, чтобы записать рассылку в outbox в той же транзакции.
+        # В брокер её отправит relay после коммита, запрос в брокер не ходит
+        await db.flush()
+        OutboxService.add_event(db, "celery_.tasks.send_news_emails_task", db_news.id)
         await db.commit()
         await db.refresh(db_news)
-    
-        cached_news = await redis_client.get(cache_key)
-    
-        if cached_news:
-            # Если кеш существует - обновляем его
-            news_list_dict = json.loads(cached_news)
-        
-            news_dict = {
-                "id": db_news.id,
-                "title": db_news.title,
-                "content": db_news.content,
-                "publication_date": db_news.publication_date.isoformat() if db_news.publication_date else None,
-                "author_id": db_news.author_id,
-                "cover_image": db_news.cover_image
-            }
-            news_list_dict.append(news_dict)
-        
-            # Обновляем кеш
-            expire_seconds = 300
-            await redis_client.set(cache_key, json.dumps(news_list_dict), ex=expire_seconds)
-            print("Кеш обновлен новой новостью")
-        else:
-            print("Кеш не существует, будет создан при следующем запросе")
-    
+
+        # Записываем в кеш только саму новость, остальные не трогаем
+        await news_cache.upsert_news(db_news)
+        NewsService._schedule_hot_pages_refresh()
+
         return db_news
 
-    async def get_news(db: AsyncSession, skip: int = 0, limit: int = 100):
-        redis_client = await get_redis()
-        cache_key = f"news_id:all"
-        # Проверяем кеш
-        cached_news = await redis_client.get(cache_key)
-        if cached_news:
-            print("Все новости есть в кеше! Возвращаем...")
-            # Возвращаем словарь python
-            news_data = json.loads(cached_news)
-            # Создаем объект News, превращая словарь в именованные аргументы
-            return [News(**news_data) for news_data in news_data]
-        
-        print("Всех новостей нет в кеше( сейчас засунем...")
-        result = await db.execute(
-            select(News)
-            .offset(skip)
+    async def get_news_page_body(db: AsyncSession, cursor: str = None, skip: int = 0, limit: int = 100):
+        """
+        Страница ленты в порядке (publication_date, id) по убыванию, готовым JSON-телом ответа:
+        (тело, курсор следующей страницы или None, версия списка, прочитанная до сборки страницы).
+        """
+        after = None
+        if cursor:
+            after = news_cache.decode_cursor(cursor)
+            if after is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        page_token = f"c{cursor}" if cursor else f"s{skip}"
+
+        page_key = f"{news_cache.NEWS_PAGE_PREFIX}:{page_token}:{limit}"
+        version, cached_page, soft_expires_at = await news_cache.get_cached_page(page_token, limit)
+        if cached_page:
+            print("Страница новостей есть в кеше! Возвращаем...")
+            if swr.is_stale(soft_expires_at):
+                # Отдаём устаревшую страницу сразу, а свежую собираем в фоне
+                swr.refresh_in_background(
+                    page_key, lambda: NewsService._refresh_page(after, skip, limit, page_token)
+                )
+            return (*cached_page, version)
+
+        async def load_cached_page():
+            _, cached_page, _ = await news_cache.get_cached_page(page_token, limit)
+            return cached_page
+
+        # Одновременные промахи по одной странице идут в БД один раз
+        body, next_cursor = await single_flight(
+            page_key,
+            lambda: NewsService._load_page(db, version, after, skip, limit, page_token),
+            load_cached_page
+        )
+        return body, next_cursor, version
+
+    async def search_news_body(db: AsyncSession, query: str, cursor: str = None, limit: int = 20):
+        """
+        Полнотекстовый поиск, от самых релевантных к менее релевантным.
+        Возвращает (готовое JSON-тело ответа, курсор следующей страницы или None).
+        """
+        after = None
+        if cursor:
+            after = search_cache.decode_search_cursor(cursor)
+            if after is None:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = search_cache.normalize_query(query)
+        if not query:
+            return "[]", None
+
+        version = await news_cache.get_list_version()
+        cache_key = search_cache.search_key(version, query, cursor, limit)
+        cached = await search_cache.get_cached_search(cache_key)
+        if cached:
+            print("Результаты поиска есть в кеше! Возвращаем...")
+            return cached
+
+        async def load_results():
+            news_items, ranks = await NewsService._search_news_in_db(db, query, after, limit)
+            body = "[" + ",".join(news_cache.news_body(news) for news in news_items) + "]"
+            next_cursor = None
+            if len(news_items) == limit:
+                next_cursor = search_cache.encode_search_cursor(ranks[-1], news_items[-1].id)
+            await search_cache.set_cached_search(cache_key, body, next_cursor)
+            return body, next_cursor
+
+        # Популярный запрос, пришедший сразу от многих клиентов, идёт в БД один раз
+        return await single_flight(
+            cache_key, load_results, lambda: search_cache.get_cached_search(cache_key)
+        )
+
+    async def _search_news_in_db(db: AsyncSession, query: str, after: tuple, limit: int):
+        ts_query = func.websearch_to_tsquery(cast(SEARCH_CONFIG, REGCONFIG), query)
+        rank = func.ts_rank_cd(News.search_vector, ts_query)
+        stmt = (
+            select(News, rank.label("rank"))
+            .where(News.search_vector.op("@@")(ts_query))
+            .order_by(rank.desc(), News.id.desc())
             .limit(limit)
         )
-        news_items = result.scalars().all()
-        # Преобразуем все новости в список словарей
-        news_list_dict = []
-        for news_item in news_items:
-            news_dict = {
-                "id": news_item.id,
-                "title": news_item.title,
-                "content": news_item.content,
-                "publication_date": news_item.publication_date.isoformat() if news_item.publication_date else None,
-                "author_id": news_item.author_id,
-                "cover_image": news_item.cover_image
-            }
-            news_list_dict.append(news_dict)
-        # 300 секунд
-        expire_seconds = 300
-        await redis_client.set(cache_key, json.dumps(news_list_dict), ex=expire_seconds)
-    
-        return news_list_dict
+        if after:
+            # Keyset по (ранг, id), как в ленте по (publication_date, id)
+            stmt = stmt.where(tuple_(rank, News.id) < tuple_(*after))
+        result = await db.execute(stmt)
+        rows = result.all()
+        return [row.News for row in rows], [row.rank for row in rows]
+
+    async def get_list_version():
+        return await news_cache.get_list_version()
+
+    async def get_news_version(news_id: int):
+        return await versions.get_version(versions.news_version_key(news_id))
+
+    async def peek_news_version(news_id: int):
+        return await versions.peek_version(versions.news_version_key(news_id))
+
+    async def _load_page(db: AsyncSession, version: str, after: str, skip: int, limit: int, page_token: str):
+        members = await news_cache.get_index_page(after=after, skip=skip, limit=limit)
+        if members is None:
+            print("Индекса новостей нет в кеше( читаем страницу из БД и строим индекс...")
+            NewsService._schedule_index_rebuild()
+            news_items = await NewsService._get_news_page_from_db(db, after, skip, limit)
+            members = [news_cache.index_member(news.publication_date, news.id) for news in news_items]
+            bodies = [news_cache.news_body(news) for news in news_items]
+        else:
+            print("Индекс новостей есть в кеше! Собираем страницу...")
+            bodies = await NewsService._get_news_bodies(db, [news_cache.member_id(member) for member in members])
+
+        # Тело страницы склеивается из готовых тел новостей без повторной сериализации
+        body = "[" + ",".join(bodies) + "]"
+        next_cursor = news_cache.encode_cursor(members[-1]) if len(members) == limit else None
+        await news_cache.set_cached_page(version, page_token, limit, body, next_cursor)
+        return body, next_cursor
+
+    async def _refresh_page(after: str, skip: int, limit: int, page_token: str):
+        # Фоновое обновление идёт со своей сессией, сессия запроса к этому времени закрыта
+        async with async_session_maker() as db:
+            version = await news_cache.get_list_version()
+            await NewsService._load_page(db, version, after, skip, limit, page_token)
+
+    async def refresh_hot_pages():
+        """Заранее обновляет первые страницы ленты, пока они не устарели."""
+        for limit in settings.HOT_NEWS_PAGE_LIMITS:
+            _, cached_page, soft_expires_at = await news_cache.get_cached_page("s0", limit)
+            if cached_page and soft_expires_at - time.time() > 2 * settings.HOT_KEYS_REFRESH_INTERVAL:
+                continue
+            await swr.refresh(
+                f"{news_cache.NEWS_PAGE_PREFIX}:s0:{limit}",
+                lambda: NewsService._refresh_page(None, 0, limit, "s0")
+            )
+
+    _hot_pages_task = None
+
+    async def _refresh_hot_pages_forever():
+        while True:
+            try:
+                await NewsService.refresh_hot_pages()
+            except Exception as e:
+                logger.error(
+                    "failed_refreshing_hot_pages",
+                    error=str(e)
+                )
+            await asyncio.sleep(settings.HOT_KEYS_REFRESH_INTERVAL)
+
+    def start_hot_pages_refresher():
+        if NewsService._hot_pages_task is None:
+            NewsService._hot_pages_task = asyncio.create_task(NewsService._refresh_hot_pages_forever())
+
+    async def stop_hot_pages_refresher():
+        task = NewsService._hot_pages_task
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            NewsService._hot_pages_task = None
+
+    def _schedule_hot_pages_refresh():
+        # После записи версия списка меняется - сразу собираем горячие страницы под новой версией
+        for limit in settings.HOT_NEWS_PAGE_LIMITS:
+            swr.refresh_in_background(
+                f"{news_cache.NEWS_PAGE_PREFIX}:s0:{limit}",
+                lambda limit=limit: NewsService._refresh_page(None, 0, limit, "s0")
+            )
+
+    async def _get_news_page_from_db(db: AsyncSession, after: str, skip: int, limit: int):
+        query = select(News).order_by(News.publication_date.desc(), News.id.desc()).limit(limit)
+        if after:
+            # Keyset: стоимость страницы не зависит от её глубины
+            query = query.where(tuple_(News.publication_date, News.id) < news_cache.member_key(after))
+        else:
+            query = query.offset(skip)
+        result = await db.execute(query)
+        return result.scalars().all()
+
+    async def get_news_batch_body(db: AsyncSession, news_ids: list):
+        """Готовое JSON-тело со списком новостей в порядке news_ids, несуществующие пропускаются."""
+        # Повторы не запрашиваем дважды, порядок первого вхождения сохраняется
+        news_ids = list(dict.fromkeys(news_ids))
+        bodies = await NewsService._get_news_bodies(db, news_ids)
+        return "[" + ",".join(bodies) + "]"
+
+    async def _get_news_bodies(db: AsyncSession, news_ids: list):
+        """Тела новостей в порядке news_ids: из кеша, а недостающие - одним запросом в БД."""
+        rows = await news_cache.get_news_rows(news_ids)
+        bodies = [news_cache.row_body(row) if row else None for row in rows]
+        missing_ids = [news_id for news_id, body in zip(news_ids, bodies) if body is None]
+        if missing_ids:
+            # Один параметр-массив вместо IN со списком: план запроса не зависит от числа id
+            result = await db.execute(
+                select(News).where(News.id == any_(cast(missing_ids, ARRAY(Integer))))
+            )
+            loaded = {news.id: news for news in result.scalars().all()}
+            await news_cache.fill_news(list(loaded.values()))
+            bodies = [
+                body if body is not None else (news_cache.news_body(loaded[news_id]) if news_id in loaded else None)
+                for news_id, body in zip(news_ids, bodies)
+            ]
+        return [body for body in bodies if body is not None]
+
+    _rebuild_task = None
+
+    def _schedule_index_rebuild():
+        # Индекс строится в фоне со своей сессией, запрос его не ждёт
+        task = NewsService._rebuild_task
+        if task is not None and not task.done():
+            return
+        NewsService._rebuild_task = asyncio.create_task(NewsService._rebuild_index())
+
+    async def _rebuild_index():
+        try:
+            async with async_session_maker() as db:
+                await news_cache.rebuild_news_index(db)
+        except Exception as e:
+            logger.error(
+                "failed_rebuilding_news_index",
+                error=str(e)
+            )
 
     async def get_news_by_id(db: AsyncSession, news_id: int):
-        redis_client = await get_redis()
-        cache_key = f"news_id:{news_id}"
         # Проверяем кеш
-        cached_news = await redis_client.get(cache_key)
-        if cached_news:
+        news_data = await news_cache.get_news_item(news_id)
+        if news_data:
             print("Новость есть в кеше! Возвращаем...")
-            # Возвращаем словарь python
-            news_data = json.loads(cached_news)
             # Создаем объект News, превращая словарь в именованные аргументы
             return News(**news_data)
         print("Новости нет в кеше( сейчас засунем...")
-        result = await db.execute(select(News).where(News.id == news_id))
-        news_item = result.scalar_one_or_none()
-        if not news_item:
+        news_data = await NewsService._load_news_by_id(db, news_id)
+        if not news_data:
             return None
-        news_dict = {
-            "id": news_item.id,
-            "title": news_item.title,
-            "content": news_item.content,
-            "publication_date": news_item.publication_date.isoformat() if news_item.publication_date else None,
-            "author_id": news_item.author_id,
-            "cover_image": news_item.cover_image
-        }
-        # 300 секунд
-        expire_seconds = 300
-        await redis_client.set(cache_key, json.dumps(news_dict), ex=expire_seconds)
-    
-        return news_item
+        return News(**news_data)
+
+    async def get_news_body_by_id(db: AsyncSession, news_id: int):
+        """Готовое JSON-тело новости или None, если новости нет."""
+        body = await news_cache.get_news_body(news_id)
+        if body:
+            print("Новость есть в кеше! Возвращаем...")
+            return body
+        print("Новости нет в кеше( сейчас засунем...")
+        news_data = await NewsService._load_news_by_id(db, news_id)
+        if not news_data:
+            return None
+        return news_cache.news_body(news_data)
+
+    async def _load_news_by_id(db: AsyncSession, news_id: int):
+        async def load_news():
+            result = await db.execute(select(News).where(News.id == news_id))
+            news_item = result.scalar_one_or_none()
+            if not news_item:
+                return None
+            await news_cache.fill_news([news_item])
+            return news_cache.as_dict(news_item)
+
+        # Одновременные промахи по одной новости идут в БД один раз
+        return await single_flight(
+            news_cache.news_key(news_id), load_news, lambda: news_cache.get_news_item(news_id)
+        )
     
     async def update_news(db: AsyncSession, news_id: int, news_update: news_schemas.NewsCreate):
-        redis_client = await get_redis()
-    
         # Получаем новость из БД
         result = await db.execute(select(News).where(News.id == news_id))
         db_news = result.scalar_one_or_none()
@@ -160,56 +305,19 @@ class NewsService:
         update_data = news_update.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_news, field, value)
+        # Версию увеличивает сама БД: параллельные обновления получают разные версии
+        db_news.row_version = News.row_version + 1
     
         await db.commit()
         await db.refresh(db_news)
-    
-        # Подготавливаем данные для кэша
-        news_dict = {
-            "id": db_news.id,
-            "title": db_news.title,
-            "content": db_news.content,
-            "publication_date": db_news.publication_date.isoformat() if db_news.publication_date else None,
-            "author_id": db_news.author_id,
-            "cover_image": db_news.cover_image
-        }
-    
-        expire_seconds = 300
-
-        # Обновляем кэш отдельной новости
-        cache_key_single = f"news_id:{news_id}"
-        await redis_client.set(cache_key_single, json.dumps(news_dict), ex=expire_seconds)
-        print(f"Кэш отдельной новости {news_id} обновлен")
-
-        # Обновляем кэш всех новостей
-        cache_key_all = "news_id:all"
-        cached_all_news = await redis_client.get(cache_key_all)
-
-        if cached_all_news:
-            news_list_dict = json.loads(cached_all_news)
-
-            # Ищем и обновляем новость в списке всех новостей
-            found = False
-            for i, news_item in enumerate(news_list_dict):
-                if news_item["id"] == news_id:
-                    news_list_dict[i] = news_dict
-                    found = True
-                    break
-        
-            # Если не нашли, добавляем новую
-            if not found:
-                news_list_dict.append(news_dict)
-        
-            await redis_client.set(cache_key_all, json.dumps(news_list_dict), ex=expire_seconds)
-            print("Кэш всех новостей обновлен")
-        else:
-            print("Кэш всех новостей не существует, будет создан при следующем запросе")
-    
+
+        await news_cache.upsert_news(db_news)
+        NewsService._schedule_hot_pages_refresh()
+        print(f"Кэш новости {news_id} обновлен")
+
         return db_news
 
     async def delete_news_with_comments(db: AsyncSession, news_id: int):
-        redis_client = await get_redis()
-    
         result = await db.execute(select(News).where(News.id == news_id))
         db_news = result.scalar_one_or_none()
     
@@ -221,26 +329,10 @@ class NewsService:
         await db.delete(db_news)
         await db.commit()
     
-        # Удаляем кэш отдельной новости
-        cache_key_single = f"news_id:{news_id}"
-        await redis_client.delete(cache_key_single)
-        print(f"Кэш отдельной новости {news_id} удален")
-    
-        # Обновляем кэш всех новостей
-        cache_key_all = "news_id:all"
-        cached_all_news = await redis_client.get(cache_key_all)
-    
-        if cached_all_news:
-            news_list_dict = json.loads(cached_all_news)
-        
-            # Удаляем новость из списка всех новостей
-            news_list_dict = [news for news in news_list_dict if news["id"] != news_id]
-        
-            # Обновляем кэш всех новостей
-            expire_seconds = 300
-            await redis_client.set(cache_key_all, json.dumps(news_list_dict), ex=expire_seconds)
-            print("Кэш всех новостей обновлен (удалена новость)")
-        else:
-            print("Кэш всех новостей не существует, ничего не делаем")
-    
+        # Удаляем новость из кэша и из индекса
+        await news_cache.delete_news(news_id, db_news.publication_date)
+        await versions.bump_versions(versions.comments_version_key(news_id))
+        NewsService._schedule_hot_pages_refresh()
+        print(f"Кэш новости {news_id} удален")
+
         return db_news
\ No newline at end of file
@@ -0,0 +1,11 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from tables.outbox import OutboxEvent
+
+class OutboxService:
+
+    def add_event(db: AsyncSession, task: str, *args):
+        """
+        Добавляет задачу Celery в outbox в текущей транзакции. Коммитит вызывающий:
+        задача уйдёт в брокер, только если закоммитятся и остальные изменения.
+        """
+        db.add(OutboxEvent(task=task, args=list(args)))
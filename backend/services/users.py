@@ -18,7 +18,7 @@ class UserService:
             )
             raise HTTPException(status_code=409, detail="Email already exists")
         
-        password = AuthService.get_password_hash(user.password)
+        password = await AuthService.get_password_hash(user.password)
         user = User(
             name=user.name,
             email=user.email,
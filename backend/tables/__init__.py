@@ -2,5 +2,7 @@ from .users import User
 from .news import News
 from .comments import Comment
 from .session import RefreshSession
+from .digests import Digest
+from .outbox import OutboxEvent
 
-__all__ = ["User", "News", "Comment", "RefreshSession"]
\ No newline at end of file
+__all__ = ["User", "News", "Comment", "RefreshSession", "Digest", "OutboxEvent"]
\ No newline at end of file
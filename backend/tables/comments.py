@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, Text, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from base import Base
 
@@ -9,4 +9,8 @@ class Comment(Base):
     text = Column(Text, nullable=False)
     news_id = Column(Integer, ForeignKey("news.id"))
     author_id = Column(Integer, ForeignKey("users.id"))
-    publication_date = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
+    publication_date = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_comments_news_id_publication_date_id", "news_id", "publication_date", "id"),
+    )
\ No newline at end of file
@@ -0,0 +1,17 @@
+from sqlalchemy import Column, Integer, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from base import Base
+
+class Digest(Base):
+    __tablename__ = "digests"
+
+    # Один дайджест на ISO-неделю
+    year = Column(Integer, primary_key=True)
+    week = Column(Integer, primary_key=True)
+    period_start = Column(DateTime(timezone=True), nullable=False)
+    period_end = Column(DateTime(timezone=True), nullable=False)
+    news_count = Column(Integer, nullable=False)
+    # Краткие записи о новостях недели: id, заголовок, автор, дата - без текста
+    items = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
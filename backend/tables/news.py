@@ -1,7 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred
 from sqlalchemy.sql import func
 from base import Base
 
+# Конфигурация полнотекстового поиска: должна совпадать в колонке и в запросах
+SEARCH_CONFIG = "russian"
+
 class News(Base):
     __tablename__ = "news"
     
@@ -10,4 +15,20 @@ class News(Base):
     content = Column(Text, nullable=False)
     publication_date = Column(DateTime(timezone=True), server_default=func.now())
     author_id = Column(Integer, ForeignKey("users.id"))
-    cover_image = Column(String(200), nullable=True)
\ No newline at end of file
+    cover_image = Column(String(200), nullable=True)
+    # Число комментариев ведёт CommentService, чтобы ленте не нужен был COUNT(*)
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Растёт при каждом изменении строки, по ней кеш не затирает новые данные старыми
+    row_version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Поисковый вектор считает сама БД, заголовок весит больше текста.
+    # deferred - в обычных запросах колонка не читается
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')",
+        persisted=True
+    )))
+
+    __table_args__ = (
+        Index("ix_news_publication_date_id", "publication_date", "id"),
+        Index("ix_news_search_vector", "search_vector", postgresql_using="gin"),
+    )
\ No newline at end of file
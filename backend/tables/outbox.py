@@ -0,0 +1,13 @@
+from sqlalchemy import Column, BigInteger, String, DateTime
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.sql import func
+from base import Base
+
+class OutboxEvent(Base):
+    __tablename__ = "outbox"
+
+    # Задача Celery, которую надо поставить после коммита транзакции, записавшей событие
+    id = Column(BigInteger, primary_key=True)
+    task = Column(String(200), nullable=False)
+    args = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
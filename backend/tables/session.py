@@ -6,8 +6,8 @@ class RefreshSession(Base):
     __tablename__ = "refresh_sessions"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, nullable=False)
+    user_id = Column(Integer, nullable=False, index=True)
     refresh_token = Column(String(500), unique=True, index=True, nullable=False)
     user_agent = Column(String, nullable=True)
-    expires_at = Column(DateTime(timezone=True), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
\ No newline at end of file
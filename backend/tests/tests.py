@@ -1,5 +1,9 @@
 # tests/test_users.py
+import os
+import socket
+import time
 import pytest
+from sqlalchemy import text
 
 @pytest.mark.asyncio
 async def test_get_news(client):
@@ -93,3 +97,688 @@ async def test_get_news_by_id(client, get_token):
     response_json = response.json()
     print(f"Parsed JSON: {response_json}")
     assert response_json["author_id"] == 1
+
+
+@pytest.mark.asyncio
+async def test_get_news_not_modified(client):
+    response = await client.get("/news/1")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = await client.get("/news/1", headers={"If-None-Match": etag})
+    assert response.status_code == 304, f"Expected 304, got {response.status_code}: {response.text}"
+    assert response.content == b""
+
+    # Несуществующая новость - 404, и ключ версии для неё не заводится
+    from redis_cache.redis_client import get_redis
+    from redis_cache.versions import news_version_key
+    missing_id = 10 ** 9
+    response = await client.get(f"/news/{missing_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 404, response.text
+    redis_client = await get_redis()
+    assert not await redis_client.exists(news_version_key(missing_id))
+
+    # Страница ленты
+    response = await client.get("/news/")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    response = await client.get("/news/", headers={"If-None-Match": etag})
+    assert response.status_code == 304, f"Expected 304, got {response.status_code}: {response.text}"
+    assert response.content == b""
+
+
+@pytest.mark.asyncio
+async def test_get_news_batch(client):
+    ids = [news["id"] for news in (await client.get("/news/", params={"limit": 3})).json()]
+    requested = list(reversed(ids)) + [ids[0], 10 ** 9]
+    response = await client.get("/news/batch", params={"ids": ",".join(map(str, requested))})
+    assert response.status_code == 200, response.text
+    # Порядок как в запросе, повторы и несуществующие id не попадают в ответ
+    assert [news["id"] for news in response.json()] == list(reversed(ids))
+
+
+@pytest.mark.asyncio
+async def test_news_cursor_pagination(client, get_token):
+    from datetime import datetime
+
+    headers = {"Authorization": f"Bearer {get_token}"}
+
+    async def post_news(title):
+        data = {"title": title, "content": "cursor", "cover_image": None, "author_id": 1}
+        response = await client.post("/news/", headers=headers, json=data)
+        assert response.status_code == 200, response.text
+        return response.json()["id"]
+
+    for i in range(5):
+        await post_news(f"cursor {i}")
+
+    response = await client.get("/news/", params={"limit": 2})
+    assert response.status_code == 200
+    news = response.json()
+    cursor = response.headers["x-next-cursor"]
+
+    # Новость, добавленная между страницами, встаёт в начало ленты и не сдвигает следующие страницы
+    inserted_id = await post_news("cursor inserted")
+    while cursor:
+        response = await client.get("/news/", params={"limit": 2, "cursor": cursor})
+        assert response.status_code == 200, response.text
+        assert len(response.json()) <= 2
+        news.extend(response.json())
+        cursor = response.headers.get("x-next-cursor")
+
+    ids = [item["id"] for item in news]
+    assert len(ids) == len(set(ids))
+    assert inserted_id not in ids
+    # Порядок (publication_date, id) по убыванию сохраняется на стыках страниц
+    keys = [(datetime.fromisoformat(item["publication_date"].replace("Z", "+00:00")), item["id"]) for item in news]
+    assert keys == sorted(keys, reverse=True)
+
+    for cursor in ("not-a-cursor", "MTIz"):
+        response = await client.get("/news/", params={"cursor": cursor})
+        assert response.status_code == 400, response.text
+
+
+@pytest.mark.asyncio
+async def test_comments_pagination_and_count(client, get_token):
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {get_token}"
+    }
+    count_before = (await client.get("/news/1")).json()["comment_count"]
+    for i in range(3):
+        response = await client.post("/news/1/comments/", headers=headers, json={"text": f"comment {i}"})
+        assert response.status_code == 200, response.text
+
+    response = await client.get("/news/1")
+    assert response.json()["comment_count"] == count_before + 3
+
+    # Обходим все комментарии страницами по 2, ни один не должен повториться или потеряться
+    ids = []
+    params = {"limit": 2}
+    while True:
+        response = await client.get("/news/1/comments/", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert len(page) <= 2
+        ids.extend(comment["id"] for comment in page)
+        if "x-next-cursor" not in response.headers:
+            break
+        params["cursor"] = response.headers["x-next-cursor"]
+    assert len(ids) == len(set(ids)) == count_before + 3
+
+
+@pytest.mark.asyncio
+async def test_get_digest_not_archived(client):
+    response = await client.get("/digests/1999-W10")
+    assert response.status_code == 404
+    # В 2021 году 52 недели
+    response = await client.get("/digests/2021-W53")
+    assert response.status_code == 404
+
+
+# Бенчмарк вставляет сотни тысяч новостей, поэтому запускается только по SEARCH_BENCHMARK=1
+SEARCH_BENCHMARK = os.getenv("SEARCH_BENCHMARK") == "1"
+SEARCH_BENCHMARK_ROWS = int(os.getenv("SEARCH_BENCHMARK_ROWS", 300000))
+SEARCH_BENCHMARK_MAX_MS = float(os.getenv("SEARCH_BENCHMARK_MAX_MS", 300))
+SEARCH_WORDS = ["экономика", "спорт", "политика", "наука", "культура", "погода",
+                "технологии", "здоровье", "образование", "транспорт", "искусство", "космос"]
+
+@pytest.mark.skipif(not SEARCH_BENCHMARK, reason="set SEARCH_BENCHMARK=1 to run the search benchmark")
+@pytest.mark.asyncio
+async def test_search_news_latency(client):
+    """Задержка поиска на нескольких сотнях тысяч новостей"""
+    from database import async_session_maker
+    from redis_cache import news_cache
+    from services.news import NewsService
+
+    async with async_session_maker() as db:
+        await db.execute(text("""
+            INSERT INTO news (title, content, author_id)
+            SELECT
+                'Бенчмарк поиска ' || i,
+                (CAST(:words AS text[]))[1 + i % 12] || ' ' || (CAST(:words AS text[]))[1 + (i / 12) % 12] || ' ' || repeat('текст новости ', 20),
+                1
+            FROM generate_series(1, :rows) AS i
+        """), {"words": SEARCH_WORDS, "rows": SEARCH_BENCHMARK_ROWS})
+        await db.commit()
+    try:
+        timings = []
+        for first, second in zip(SEARCH_WORDS, SEARCH_WORDS[1:] + SEARCH_WORDS[:1]):
+            for query in (first, f"{first} {second}"):
+                start = time.perf_counter()
+                response = await client.get("/news/search", params={"q": query, "limit": 20})
+                timings.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.text
+                assert len(response.json()) == 20
+                assert "x-next-cursor" in response.headers
+
+                # Вторая страница по курсору не повторяет первую
+                next_page = await client.get(
+                    "/news/search",
+                    params={"q": query, "limit": 20, "cursor": response.headers["x-next-cursor"]}
+                )
+                assert next_page.status_code == 200
+                first_ids = {news["id"] for news in response.json()}
+                assert first_ids.isdisjoint(news["id"] for news in next_page.json())
+
+        start = time.perf_counter()
+        response = await client.get("/news/search", params={"q": f"  {SEARCH_WORDS[0].upper()} ", "limit": 20})
+        cached_ms = (time.perf_counter() - start) * 1000
+        assert response.status_code == 200
+
+        timings.sort()
+        p50 = timings[len(timings) // 2]
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        print(f"Поиск по {SEARCH_BENCHMARK_ROWS} новостям: p50 {p50:.1f} мс, p95 {p95:.1f} мс, из кеша {cached_ms:.1f} мс")
+        assert p95 < SEARCH_BENCHMARK_MAX_MS, f"Search p95 {p95:.1f} ms exceeds {SEARCH_BENCHMARK_MAX_MS} ms"
+    finally:
+        # Фоновое перестроение индекса могло начаться во время теста - ждём его,
+        # чтобы оно не вернуло в Redis уже удалённые новости
+        if NewsService._rebuild_task is not None:
+            await NewsService._rebuild_task
+        async with async_session_maker() as db:
+            result = await db.execute(text("DELETE FROM news WHERE title LIKE 'Бенчмарк поиска %' RETURNING id"))
+            news_ids = list(result.scalars())
+            await db.commit()
+            # Хеши новостей живут без TTL: удаляем их и перестраиваем индекс,
+            # перестроение меняет и версию списка, так что кешированные выдачи больше не читаются
+            await news_cache.forget_news(news_ids)
+            await news_cache.rebuild_news_index(db)
+
+
+class RecordingSMTPHandler:
+    """Локальный SMTP-сервер для тестов: принимает письма и отклоняет адреса из rejected."""
+
+    def __init__(self, rejected):
+        self.rejected = set(rejected)
+        self.delivered = []
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address in self.rejected:
+            return "550 mailbox unavailable"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.delivered.extend(envelope.rcpt_tos)
+        return "250 Message accepted for delivery"
+
+def test_email_delivery_retries_only_failed(monkeypatch):
+    from aiosmtpd.controller import Controller
+    from config import settings
+    from celery_ import mailer
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    handler = RecordingSMTPHandler(rejected={"user3@example.com", "user7@example.com"})
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    monkeypatch.setattr(settings, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(settings, "SMTP_PORT", port)
+    monkeypatch.setattr(mailer, "_pool", None)
+    try:
+        news_data = {"title": "Заголовок", "content": "Текст"}
+        users = [{"id": i, "name": f"user{i}", "email": f"user{i}@example.com"} for i in range(10)]
+        failed = mailer.deliver(news_data, users, batch_size=4)
+        assert [user["id"] for user in failed] == [3, 7]
+        assert sorted(handler.delivered) == sorted(
+            user["email"] for user in users if user["id"] not in (3, 7)
+        )
+
+        # Повтор уходит только тем, кому письмо не дошло
+        handler.rejected.clear()
+        handler.delivered.clear()
+        assert mailer.deliver(news_data, failed) == []
+        assert sorted(handler.delivered) == ["user3@example.com", "user7@example.com"]
+    finally:
+        mailer._pool.close()
+        controller.stop()
+
+@pytest.mark.asyncio
+async def test_password_hashing_pool(monkeypatch):
+    import asyncio
+    from argon2 import PasswordHasher
+    from fastapi import HTTPException
+    from config import settings
+    from auth import passwords
+
+    # Хеш со старыми параметрами проверяется и сразу пересчитывается с текущими
+    old_hash = PasswordHasher(time_cost=1, memory_cost=8192, parallelism=1).hash("secret")
+    assert await passwords.verify_password("wrong", old_hash) == (False, None)
+    verified, new_hash = await passwords.verify_password("secret", old_hash)
+    assert verified and new_hash and not passwords.ph.check_needs_rehash(new_hash)
+    assert await passwords.verify_password("secret", new_hash) == (True, None)
+
+    # Пока идёт хеширование, event loop не блокируется
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.001)
+            ticks += 1
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.gather(*(passwords.hash_password("secret") for _ in range(4)))
+    ticker_task.cancel()
+    assert ticks > 0
+
+    # Переполненная очередь отвечает 503, а не копит запросы
+    monkeypatch.setattr(settings, "PASSWORD_HASH_MAX_PENDING", 1)
+    results = await asyncio.gather(
+        passwords.hash_password("secret"), passwords.hash_password("secret"), return_exceptions=True
+    )
+    assert isinstance(results[1], HTTPException) and results[1].status_code == 503
+
+def test_access_token_claims_cache():
+    from datetime import datetime, timedelta
+    import jwt
+    from config import settings
+    from auth.dependencies import _verify_access_token
+    from redis_cache.local_cache import claims_local_cache
+
+    claims_local_cache.clear()
+    token = jwt.encode(
+        {"user_id": 1, "type": "access", "exp": datetime.utcnow() + timedelta(minutes=5)},
+        settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+    assert _verify_access_token(token)["user_id"] == 1
+    # Повторная проверка берёт claims из кеша, сам токен в ключе не хранится
+    assert len(claims_local_cache._data) == 1 and token not in claims_local_cache._data
+    assert _verify_access_token(token)["user_id"] == 1
+
+    # Запись не переживает exp токена
+    expiring = jwt.encode(
+        {"user_id": 2, "type": "access", "exp": datetime.utcnow() + timedelta(seconds=1)},
+        settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+    assert _verify_access_token(expiring)["user_id"] == 2
+    time.sleep(1.5)
+    assert _verify_access_token(expiring) is None
+
+@pytest.mark.asyncio
+async def test_user_sessions_listing(client):
+    from datetime import datetime, timedelta
+    from auth.service import AuthService
+    from auth.sessions import SessionStore
+    from redis_cache.redis_client import get_redis
+    from redis_cache.session_cache import sessions_key
+
+    response = await client.post("/auth/login", json={"email": "admin@example.com", "password": "admin123"})
+    assert response.status_code == 200
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    user_id = (await client.get("/auth/me", headers=headers)).json()["id"]
+
+    prefix = f"test-session-{time.time_ns()}"
+    sessions = {
+        name: AuthService.build_refresh_session(user_id, f"{prefix}-{name}", "pytest")
+        for name in ("live", "expired", "revoked")
+    }
+    sessions["expired"]["expires_at"] = datetime.utcnow() - timedelta(seconds=1)
+    for session in sessions.values():
+        await SessionStore.create(user_id, session["refresh_token"], session)
+    assert await SessionStore.revoke(user_id, sessions["revoked"]["refresh_token"])
+
+    # В списке только живые сессии, истёкшая заодно удаляется из хеша
+    tokens = {session["refresh_token"] for session in await SessionStore.user_sessions(user_id)}
+    assert sessions["live"]["refresh_token"] in tokens
+    assert sessions["expired"]["refresh_token"] not in tokens
+    assert sessions["revoked"]["refresh_token"] not in tokens
+    redis_client = await get_redis()
+    assert not await redis_client.hexists(sessions_key(user_id), sessions["expired"]["refresh_token"])
+
+    assert await SessionStore.revoke(user_id, sessions["live"]["refresh_token"])
+    tokens = {session["refresh_token"] for session in await SessionStore.user_sessions(user_id)}
+    assert sessions["live"]["refresh_token"] not in tokens
+
+
+@pytest.mark.asyncio
+async def test_refresh_rotation_single_winner(client):
+    import asyncio
+
+    response = await client.post("/auth/login", json={"email": "admin@example.com", "password": "admin123"})
+    assert response.status_code == 200
+    refresh_token = response.json()["refresh_token"]
+    headers = {"Authorization": f"Bearer {refresh_token}"}
+
+    # Несколько одновременных refresh с одним токеном - новую пару получает только один
+    responses = await asyncio.gather(*(client.post("/auth/refresh", headers=headers) for _ in range(10)))
+    statuses = sorted(response.status_code for response in responses)
+    assert statuses == [200] + [401] * 9
+
+    winner = next(response for response in responses if response.status_code == 200)
+    new_refresh_token = winner.json()["refresh_token"]
+    assert new_refresh_token != refresh_token
+    response = await client.post("/auth/refresh", headers={"Authorization": f"Bearer {new_refresh_token}"})
+    assert response.status_code == 200
+
+@pytest.mark.asyncio
+async def test_refresh_session_survives_redis_loss(client):
+    import asyncio
+    from sqlalchemy import select
+    from auth.sessions import SessionStore
+    from database import async_session_maker
+    from tables.session import RefreshSession
+    from redis_cache.redis_client import get_redis
+    from redis_cache.session_cache import sessions_key
+
+    response = await client.post("/auth/login", json={"email": "admin@example.com", "password": "admin123"})
+    assert response.status_code == 200
+    refresh_token = response.json()["refresh_token"]
+    user_id = (await client.get("/auth/me", headers={"Authorization": f"Bearer {response.json()['access_token']}"})).json()["id"]
+
+    # Сессия попала в refresh_sessions (её может перенести и фоновый писатель), после чего Redis её потерял
+    for _ in range(50):
+        await SessionStore.flush_write_behind()
+        async with async_session_maker() as db:
+            result = await db.execute(select(RefreshSession.id).where(RefreshSession.refresh_token == refresh_token))
+            if result.scalar_one_or_none() is not None:
+                break
+        await asyncio.sleep(0.1)
+    else:
+        pytest.fail("refresh session was not written to refresh_sessions")
+    redis_client = await get_redis()
+    await redis_client.delete(sessions_key(user_id))
+
+    headers = {"Authorization": f"Bearer {refresh_token}"}
+    response = await client.post("/auth/refresh", headers=headers)
+    assert response.status_code == 200
+    # Старый токен отозван в Redis и не поднимается из БД второй раз
+    response = await client.post("/auth/refresh", headers=headers)
+    assert response.status_code == 401
+
+    # После переноса в БД отметка об отзыве убирается из хеша, в нём остаются только живые сессии
+    for _ in range(50):
+        await SessionStore.flush_write_behind()
+        if not await redis_client.hexists(sessions_key(user_id), refresh_token):
+            break
+        await asyncio.sleep(0.1)
+    else:
+        pytest.fail("revoked marker was not removed after write-behind")
+    response = await client.post("/auth/refresh", headers=headers)
+    assert response.status_code == 401
+
+def test_email_task_concurrent_run_suppressed(monkeypatch):
+    from prometheus_client import REGISTRY
+    from redis_cache import redis_client as redis_client_module
+    from celery_ import idempotency
+    from celery_.runtime import runtime
+    from celery_.tasks import send_email_task
+
+    # Среда воркера заводит свой клиент Redis - после теста возвращаем клиент приложения
+    monkeypatch.setattr(redis_client_module, "redis_client", redis_client_module.redis_client)
+
+    def suppressed(task: str) -> float:
+        return REGISTRY.get_sample_value("task_duplicates_suppressed_total", {"task": task}) or 0
+
+    news_id, user_ids = 10 ** 9, [1, 2, 3]
+    key = f"test:{time.time_ns()}"
+    users = [{"id": user_id} for user_id in user_ids]
+    try:
+        # Первый запуск захватил порцию и получателей и ещё отправляет письма
+        first = idempotency.claim("send_email_task", key)
+        assert first is not None
+        assert idempotency.claim_recipients(news_id, users, first) == users
+
+        # Повторная доставка того же сообщения в это время ничего не делает
+        before = suppressed("send_email_task")
+        result = send_email_task.apply(args=(news_id, user_ids), kwargs={"idempotency_key": key}).get()
+        assert result == {"status": "duplicate", "count": 0}
+        assert suppressed("send_email_task") == before + 1
+
+        # Получателей, которые заняты первым запуском, второй не получает
+        before = suppressed("send_email_recipient")
+        assert idempotency.claim_recipients(news_id, users, "second-run") == []
+        assert suppressed("send_email_recipient") == before + len(users)
+
+        # Письмо ушло только первому, остальных первый запуск отпустил - их можно повторить
+        idempotency.mark_sent(news_id, users[:1])
+        idempotency.release_recipients(news_id, users, first)
+        assert idempotency.claim_recipients(news_id, users, "retry") == users[1:]
+    finally:
+        async def cleanup():
+            await redis_client_module.redis_client.delete(
+                idempotency.done_key(key), *(idempotency.sent_key(news_id, user_id) for user_id in user_ids)
+            )
+        runtime.run(cleanup())
+        runtime.stop()
+
+def test_send_news_emails_task_chunks_and_groups(monkeypatch):
+    from prometheus_client import REGISTRY
+    from sqlalchemy import select
+    from config import settings
+    from redis_cache import redis_client as redis_client_module
+    from celery_ import idempotency, tasks
+    from celery_.runtime import runtime, session
+    from tables.users import User
+
+    # Среда воркера заводит свой клиент Redis - после теста возвращаем клиент приложения
+    monkeypatch.setattr(redis_client_module, "redis_client", redis_client_module.redis_client)
+    monkeypatch.setattr(settings, "EMAIL_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "EMAIL_GROUP_SIZE", 2)
+
+    # Группы не уходят в брокер, а записываются: в каждой - аргументы порций
+    groups = []
+
+    class RecordingGroup:
+        def __init__(self, signatures):
+            self.signatures = signatures
+
+        def apply_async(self):
+            groups.append([signature.args for signature in self.signatures])
+
+    monkeypatch.setattr(tasks, "group", RecordingGroup)
+
+    def suppressed() -> float:
+        return REGISTRY.get_sample_value("task_duplicates_suppressed_total", {"task": "send_news_emails_task"}) or 0
+
+    async def all_user_ids():
+        async with session() as db:
+            return list((await db.execute(select(User.id).order_by(User.id))).scalars())
+
+    key = f"test:send_news_emails:{time.time_ns()}"
+    try:
+        user_ids = runtime.run(all_user_ids())
+        result = tasks.send_news_emails_task.apply(args=(1,), kwargs={"idempotency_key": key}).get()
+        chunks = [args for group in groups for args in group]
+        assert result == {"status": "dispatched", "news_id": 1, "chunks": len(chunks)}
+
+        # Получатели идут порциями по EMAIL_CHUNK_SIZE, порции - группами по EMAIL_GROUP_SIZE
+        assert all(news_id == 1 for news_id, _ in chunks)
+        assert [user_id for _, chunk in chunks for user_id in chunk] == user_ids
+        assert all(len(chunk) == 2 for _, chunk in chunks[:-1]) and 1 <= len(chunks[-1][1]) <= 2
+        assert all(len(group) == 2 for group in groups[:-1]) and 1 <= len(groups[-1]) <= 2
+
+        # Повторная доставка события рассылку второй раз не раздаёт
+        groups.clear()
+        before = suppressed()
+        result = tasks.send_news_emails_task.apply(args=(1,), kwargs={"idempotency_key": key}).get()
+        assert result == {"status": "duplicate", "news_id": 1}
+        assert groups == []
+        assert suppressed() == before + 1
+    finally:
+        async def cleanup():
+            await redis_client_module.redis_client.delete(idempotency.done_key(key))
+        runtime.run(cleanup())
+        runtime.stop()
+
+
+def test_task_routes_and_queue_keys():
+    from kombu.transport.redis import Channel
+    from celery_.app import QUEUES, PRIORITY_STEPS, queue_keys
+    from celery_.tasks import app
+
+    expected = {
+        "celery_.tasks.send_email_task": ("transactional", 0),
+        "celery_.tasks.send_news_emails_task": ("bulk", 3),
+        "celery_.tasks.backfill_digests_task": ("bulk", 9),
+        "celery_.tasks.sunday_reminder_task": ("reports", 3),
+        "celery_.tasks.archive_digest_task": ("reports", 9),
+    }
+    assert sorted(name for name in app.tasks if name.startswith("celery_.")) == sorted(expected)
+    for name, (queue, priority) in expected.items():
+        route = app.amqp.router.route({}, name, args=(), kwargs={})
+        assert (route["queue"].name, route["priority"]) == (queue, priority), name
+
+    # Экспортер глубины читает те же ключи, в которые брокер кладёт сообщения по приоритетам
+    channel = object.__new__(Channel)
+    for option, value in app.conf.broker_transport_options.items():
+        if option in Channel.from_transport_options:
+            setattr(channel, option, value)
+    for queue in QUEUES:
+        assert queue_keys(queue) == [channel._q_for_pri(queue, priority) for priority in PRIORITY_STEPS]
+        assert channel._q_for_pri(queue, 0) == queue
+
+
+@pytest.mark.asyncio
+async def test_create_news_writes_outbox_and_relay_publishes(client, get_token, monkeypatch):
+    from database import async_session_maker
+    from celery_ import outbox_relay
+
+    headers = {"Authorization": f"Bearer {get_token}"}
+    data = {"title": "outbox", "content": "outbox", "cover_image": None, "author_id": 1}
+    response = await client.post("/news/", headers=headers, json=data)
+    assert response.status_code == 200
+    news_id = response.json()["id"]
+
+    # Событие рассылки записано в той же транзакции, что и новость: у строк один xmin
+    task = "celery_.tasks.send_news_emails_task"
+    async with async_session_maker() as db:
+        news_xmin = (await db.execute(
+            text("SELECT xmin::text FROM news WHERE id = :id"), {"id": news_id}
+        )).scalar_one()
+        outbox_rows = (await db.execute(
+            text("SELECT id, xmin::text FROM outbox WHERE task = :task AND args = CAST(:args AS jsonb)"),
+            {"task": task, "args": f"[{news_id}]"}
+        )).all()
+    assert len(outbox_rows) == 1
+    event_id, event_xmin = outbox_rows[0]
+    assert event_xmin == news_xmin
+
+    # Relay отправляет задачу в брокер и удаляет строку
+    sent = []
+    monkeypatch.setattr(outbox_relay.app, "send_task", lambda name, args=None, **kwargs: sent.append((name, args)))
+    while await outbox_relay.relay_batch():
+        pass
+    assert (task, [news_id]) in sent
+    async with async_session_maker() as db:
+        remaining = (await db.execute(
+            text("SELECT count(*) FROM outbox WHERE id = :id"), {"id": event_id}
+        )).scalar_one()
+    assert remaining == 0
+
+def test_local_cache_lru_and_ttl():
+    from redis_cache.local_cache import LocalCache
+
+    cache = LocalCache("test_lru", maxsize=2, ttl=0.2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Чтение поднимает запись, при переполнении вытесняется самая давно прочитанная
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+    # Запись не живёт дольше ttl кеша, а свой ttl может его только укоротить
+    cache = LocalCache("test_ttl", maxsize=2, ttl=0.2)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=0.05)
+    time.sleep(0.1)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    time.sleep(0.15)
+    assert cache.get("a") is None
+
+    # Значение, прочитанное до инвалидации, не кладётся
+    token = cache.token()
+    cache.delete("c")
+    cache.set("c", 3, token=token)
+    assert cache.get("c") is None
+
+@pytest.mark.asyncio
+async def test_local_cache_invalidated_by_publish(client):
+    import asyncio
+    from redis_cache.redis_client import get_redis
+    from redis_cache.local_cache import news_local_cache, INVALIDATION_CHANNEL
+
+    key = str(10 ** 9)
+    news_local_cache.set(key, {"id": key})
+    # Сообщение от другого воркера удаляет запись из кеша этого процесса
+    redis_client = await get_redis()
+    for _ in range(50):
+        await redis_client.publish(INVALIDATION_CHANNEL, f"{news_local_cache.name}:{key}")
+        await asyncio.sleep(0.05)
+        if key not in news_local_cache._data:
+            break
+    else:
+        pytest.fail("local cache entry was not evicted by cache:invalidate")
+
+@pytest.mark.asyncio
+async def test_single_flight_loads_once(client):
+    import asyncio
+    from redis_cache.single_flight import single_flight
+
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return "value"
+
+    async def load_cached():
+        return None
+
+    # Одновременные промахи по одному ключу ждут одну загрузку
+    key = f"test:single_flight:{time.time_ns()}"
+    results = await asyncio.gather(*(single_flight(key, loader, load_cached) for _ in range(20)))
+    assert results == ["value"] * 20
+    assert calls == 1
+
+    # Следующий промах после загрузки снова идёт в loader
+    assert await single_flight(key, loader, load_cached) == "value"
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_news_page_stale_while_revalidate(client, monkeypatch):
+    import asyncio
+    from config import settings
+    from redis_cache import news_cache
+    from services.news import NewsService
+
+    skip, limit = 10 ** 6, 7
+    page_token = f"s{skip}"
+    refreshes, loads = [], []
+
+    async def refresh_page(after, skip, limit, token):
+        refreshes.append(token)
+        await asyncio.sleep(0.1)
+
+    async def load_page(db, version, after, skip, limit, token):
+        loads.append(token)
+        return '["fresh"]', None
+
+    monkeypatch.setattr(NewsService, "_refresh_page", refresh_page)
+    monkeypatch.setattr(NewsService, "_load_page", load_page)
+    # Мягкий срок страницы уже прошёл, жёсткий наступит через секунду
+    monkeypatch.setattr(settings, "CACHE_SOFT_TTL", -1)
+    monkeypatch.setattr(settings, "CACHE_HARD_TTL", 1)
+    version = await news_cache.get_list_version()
+    await news_cache.set_cached_page(version, page_token, limit, '["stale"]')
+
+    # Устаревшая страница отдаётся сразу, а обновляется в фоне один раз
+    results = await asyncio.gather(*(
+        NewsService.get_news_page_body(db=None, skip=skip, limit=limit) for _ in range(5)
+    ))
+    assert [body for body, _, _ in results] == ['["stale"]'] * 5
+    assert loads == []
+    await asyncio.sleep(0.3)
+    assert [token for token in refreshes if token == page_token] == [page_token]
+
+    # После жёсткого срока записи в Redis нет - страницу собирает загрузчик
+    await asyncio.sleep(1.2)
+    body, _, _ = await NewsService.get_news_page_body(db=None, skip=skip, limit=limit)
+    assert body == '["fresh"]'
+    assert loads == [page_token]
+